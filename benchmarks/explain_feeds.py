@@ -0,0 +1,118 @@
+"""Проверяет по EXPLAIN, что запросы лент используют составные индексы.
+
+    python -m benchmarks.explain_feeds --posts 50000
+"""
+import argparse
+import random
+import sys
+
+from benchmarks.common import setup, test_database, timed
+
+
+def seed(posts, users, groups):
+    from django.contrib.auth import get_user_model
+    from django.db import connection
+    from posts.models import Comment, Follow, Group, Post
+
+    User = get_user_model()
+    rnd = random.Random(0)
+    User.objects.bulk_create(
+        (User(username=f'user_{i}') for i in range(users)), batch_size=500)
+    user_ids = list(User.objects.values_list('pk', flat=True))
+    Group.objects.bulk_create(
+        Group(title=f'group_{i}', slug=f'group-{i}', description='')
+        for i in range(groups))
+    group_ids = list(Group.objects.values_list('pk', flat=True))
+    Post.objects.bulk_create(
+        (Post(text=f'post {i}',
+              author_id=rnd.choice(user_ids),
+              group_id=rnd.choice(group_ids + [None]))
+         for i in range(posts)),
+        batch_size=500,
+    )
+    with connection.cursor() as cursor:
+        # bulk_create ставит всем постам одно и то же время публикации
+        cursor.execute(
+            "UPDATE posts_post SET pub_date = "
+            "datetime(pub_date, '-' || (%s - id) || ' minutes')",
+            [posts],
+        )
+    post_ids = list(Post.objects.values_list('pk', flat=True)[:1000])
+    Comment.objects.bulk_create(
+        (Comment(post_id=rnd.choice(post_ids),
+                 author_id=rnd.choice(user_ids),
+                 text='comment')
+         for _ in range(posts // 10)),
+        batch_size=500,
+    )
+    pairs = {(rnd.choice(user_ids), rnd.choice(user_ids))
+             for _ in range(users * 5)}
+    Follow.objects.bulk_create(
+        (Follow(user_id=user, author_id=author)
+         for user, author in pairs if user != author),
+        batch_size=500,
+    )
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+
+def cases():
+    from django.contrib.auth import get_user_model
+    from django.test import override_settings
+    from posts import timeline
+    from posts.models import Comment, Follow, Group, Post
+
+    User = get_user_model()
+    user = User.objects.order_by('pk').first()
+    group = Group.objects.order_by('pk').first()
+    post = Post.objects.filter(comment_count__gt=0).first() or \
+        Post.objects.first()
+    with override_settings(POSTS_TIMELINE=True):
+        timeline_posts = timeline.posts_for(user)
+    return {
+        'index': (Post.objects.for_feed()[:10], 'post_pub_date_idx'),
+        'index (cursor)': (
+            Post.objects.for_feed().order_by('-pub_date', '-id')[:10],
+            'post_pub_date_idx'),
+        'group_posts': (group.group_posts.for_feed()[:10],
+                        'post_group_pub_date_idx'),
+        'profile': (user.author_posts.for_feed()[:10],
+                    'post_author_pub_date_idx'),
+        'follow_index': (timeline.posts_for(user)[:10], 'post_pub_date_idx'),
+        'follow_index (timeline)': (timeline_posts[:10], 'timeline_feed_idx'),
+        'post comments': (
+            Comment.objects.filter(post=post).order_by('created', 'id'),
+            'comment_post_created_idx'),
+        # индекс уникальности (user, author); просто 'posts_follow'
+        # нашлось бы и в полном SCAN таблицы
+        'is_following': (
+            Follow.objects.filter(user=user, author=user),
+            'USING COVERING INDEX sqlite_autoindex_posts_follow_1'),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--posts', type=int, default=20000)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--groups', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    setup()
+    ok = True
+    with test_database():
+        seed(args.posts, args.users, args.groups)
+        for name, (queryset, index) in cases().items():
+            plan = queryset.explain()
+            used = index in plan and 'TEMP B-TREE' not in plan
+            ok &= used
+            seconds = timed(lambda: list(queryset.all()))
+            print(f'{name:24} {seconds * 1000:8.2f} ms  '
+                  f'{"OK  " if used else "FAIL"} {index}')
+            for line in plan.splitlines():
+                print(f'{"":26}{line}')
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,101 @@
+"""Профиль с последовательными и параллельными независимыми запросами
+(POSTS_GATHER_WORKERS = 0 и N) при задержке на каждый SQL-запрос, как у
+БД по сети.
+
+Запросы идут тестовым клиентом в нескольких потоках — как в
+многопоточном воркере — к временной базе в файле (in-memory SQLite
+другим потокам не видна). Кэш отключён.
+
+    python -m benchmarks.gather --latency-ms 2 --threads 1 4
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import setup
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--posts', type=int, default=5000)
+    parser.add_argument('--latency-ms', type=float, default=2)
+    parser.add_argument('--workers', type=int, default=4,
+                        help='POSTS_GATHER_WORKERS для второго прогона')
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 4],
+                        help='Одновременных запросов')
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args(argv)
+
+    directory = tempfile.TemporaryDirectory()
+    os.environ['YATUBE_DATABASE_NAME'] = os.path.join(directory.name,
+                                                      'db.sqlite3')
+    setup()
+    from django.conf import settings
+    from django.contrib.auth import get_user_model
+    from django.core.management import call_command
+    from django.db.backends.signals import connection_created
+    from django.test import Client
+    from django.urls import reverse
+    from posts.dataset import Generator
+    from yatube import metrics
+
+    settings.DEBUG = False
+    settings.ALLOWED_HOSTS = ['testserver']
+    settings.CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+    call_command('migrate', verbosity=0)
+    Generator(seed=0).generate(args.users, 10, args.posts, 0,
+                               args.users * 5)
+
+    def slow(execute, sql, params, many, context):
+        time.sleep(args.latency_ms / 1000)
+        return execute(sql, params, many, context)
+
+    def add_latency(sender, connection, **kwargs):
+        connection.execute_wrappers.append(slow)
+
+    connection_created.connect(add_latency)
+
+    User = get_user_model()
+    viewer = User.objects.filter(follower__isnull=False).first()
+    authors = list(User.objects.order_by('pk').values_list('username',
+                                                           flat=True))
+    urls = [reverse('profile', args=[authors[i % len(authors)]])
+            for i in range(args.requests)]
+
+    def run(threads):
+        def fetch(url):
+            if not hasattr(fetch.local, 'client'):
+                fetch.local.client = Client()
+                fetch.local.client.force_login(viewer)
+            begin = time.perf_counter()
+            response = fetch.local.client.get(url)
+            assert response.status_code == 200, response.status_code
+            return time.perf_counter() - begin
+
+        fetch.local = threading.local()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            started = time.perf_counter()
+            timings = list(pool.map(fetch, urls))
+            elapsed = time.perf_counter() - started
+        return len(urls) / elapsed, metrics.percentile(timings, 50) * 1000
+
+    print(f'задержка запроса {args.latency_ms} мс')
+    print(f'{"потоков":>8}{"gather":>8}{"запросов/с":>12}{"p50, мс":>10}')
+    for threads in args.threads:
+        for workers in (0, args.workers):
+            settings.POSTS_GATHER_WORKERS = workers
+            rps, p50 = run(threads)
+            print(f'{threads:>8}{workers:>8}{rps:>12.1f}{p50:>10.2f}')
+    directory.cleanup()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
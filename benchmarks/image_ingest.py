@@ -0,0 +1,103 @@
+"""Сколько места занимают картинки постов и сколько стоит их декодировать
+при создании миниатюр: оригинал с камеры против обработанной при
+загрузке копии (posts/images.py) в JPEG и WebP.
+
+Снимки синтетические — шум поверх градиента, чтобы кодек не сжимал их
+до нуля, — с EXIF, как у камеры. «миниатюра» — открыть файл и вырезать
+960x339, как делает sorl для карточки.
+
+    python -m benchmarks.image_ingest --size 4032x3024 --images 3
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+from benchmarks.common import setup, timed
+
+FORMATS = ('JPEG', 'WEBP')
+
+
+def camera_jpeg(path, width, height, seed):
+    from PIL import Image
+
+    gradient = Image.linear_gradient('L').resize((width, height))
+    noise = Image.effect_noise((width, height), 40 + seed)
+    image = Image.merge('RGB', (gradient, noise, gradient.rotate(180)))
+    exif = Image.Exif()
+    exif[0x010f] = 'Camera'
+    exif[0x0112] = 1
+    image.save(path, 'JPEG', quality=95, exif=exif.tobytes())
+
+
+def thumbnail(path):
+    from PIL import Image, ImageOps
+
+    with Image.open(path) as image:
+        ImageOps.fit(image, (960, 339), Image.LANCZOS)
+
+
+def ingest(path, fmt):
+    """Обрабатывает файл как PostForm и возвращает путь к результату."""
+    from django.conf import settings
+    from django.core.files.uploadedfile import TemporaryUploadedFile
+    from posts import images
+
+    settings.POSTS_IMAGE_FORMAT = fmt
+    upload = TemporaryUploadedFile(os.path.basename(path), 'image/jpeg',
+                                   os.path.getsize(path), None)
+    with open(path, 'rb') as source:
+        upload.write(source.read())
+    upload.seek(0)
+    processed = images.process(upload)
+    output = os.path.join(os.path.dirname(path),
+                          f'{fmt}-{processed.name}')
+    with open(output, 'wb') as file:
+        for chunk in processed.chunks():
+            file.write(chunk)
+    upload.close()
+    return output
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--size', default='4032x3024')
+    parser.add_argument('--images', type=int, default=3)
+    parser.add_argument('--quality', type=int, default=85)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+    width, height = map(int, args.size.split('x'))
+
+    setup()
+    from django.conf import settings
+
+    settings.POSTS_IMAGE_QUALITY = args.quality
+    with tempfile.TemporaryDirectory() as directory:
+        originals = []
+        for i in range(args.images):
+            path = os.path.join(directory, f'photo{i}.jpg')
+            camera_jpeg(path, width, height, i)
+            originals.append(path)
+
+        print(f'{"":12}{"размер, КБ":>12}{"загрузка, мс":>14}'
+              f'{"миниатюра, мс":>15}')
+        rows = [('оригинал', originals, 0)]
+        for fmt in FORMATS:
+            stored = [ingest(path, fmt) for path in originals]
+            seconds = sum(timed(lambda path=path: ingest(path, fmt),
+                                args.repeat) for path in originals)
+            rows.append((fmt, stored, seconds))
+        for name, paths, seconds in rows:
+            size = sum(os.path.getsize(path) for path in paths)
+            decode = sum(timed(lambda path=path: thumbnail(path), args.repeat)
+                         for path in paths)
+            count = len(paths)
+            ingest_ms = f'{seconds / count * 1000:.1f}' if seconds else '-'
+            print(f'{name:12}{size / count / 1024:>12.1f}{ingest_ms:>14}'
+                  f'{decode / count * 1000:>15.1f}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
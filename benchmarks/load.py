@@ -0,0 +1,285 @@
+"""Нагрузочный прогон публичных страниц и форм.
+
+По умолчанию запросы идут через тестовый клиент Django в отдельной
+тестовой базе, которую прогон заполняет сам:
+
+    python -m benchmarks.load --posts 20000 -o report.json
+    python -m benchmarks.load --compare report.json
+
+С --url запросы идут по HTTP в запущенный сервер (runserver, gunicorn).
+Адреса берутся из базы из настроек, то есть той же, что у сервера;
+заполнить её можно командой generate_dataset. По HTTP меряются только
+страницы на чтение, число SQL-запросов в этом режиме не известно.
+
+    python -m benchmarks.load --url http://127.0.0.1:8000 --concurrency 8
+"""
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import setup, test_database
+
+READS = ('index', 'group_posts', 'profile', 'post_view', 'follow_index')
+WRITES = ('new_post', 'add_comment', 'post_edit', 'profile_follow')
+
+
+def seed(users, groups, posts, comments, follows):
+    from posts.dataset import Generator
+
+    Generator(seed=0).generate(users, groups, posts, comments, follows)
+
+
+class Targets:
+    """Готовые к запросу адреса, выбранные из базы один раз."""
+
+    SAMPLE = 200
+
+    def __init__(self, rnd):
+        from django.contrib.auth import get_user_model
+        from posts.models import Group, Post
+
+        User = get_user_model()
+        self.rnd = rnd
+        self.usernames = list(User.objects.order_by('?').values_list(
+            'username', flat=True)[:self.SAMPLE])
+        self.groups = list(Group.objects.values_list('slug', flat=True)
+                           [:self.SAMPLE])
+        self.posts = list(Post.objects.order_by('?').values_list(
+            'author__username', 'pk')[:self.SAMPLE])
+        self.viewer = (User.objects.filter(follower__isnull=False)
+                       .order_by('pk').first()
+                       or User.objects.order_by('pk').first())
+        self.own_post = (Post.objects.filter(author=self.viewer)
+                         .values_list('pk', flat=True).first())
+        self.page_count = max(1, min(5, Post.objects.count() // 10))
+
+    def available(self, name):
+        needs = {'group_posts': self.groups, 'profile': self.usernames,
+                 'post_view': self.posts, 'add_comment': self.posts,
+                 'profile_follow': self.usernames, 'post_edit': self.own_post}
+        return bool(needs.get(name, True))
+
+    def page(self):
+        return {'page': self.rnd.randint(1, self.page_count)}
+
+    def request(self, name):
+        """(метод, адрес, данные) для очередного запроса сценария."""
+        from django.urls import reverse
+
+        rnd = self.rnd
+        if name == 'index':
+            return 'get', reverse('index'), self.page()
+        if name == 'group_posts':
+            slug = rnd.choice(self.groups)
+            return 'get', reverse('group_posts', args=[slug]), self.page()
+        if name == 'profile':
+            username = rnd.choice(self.usernames)
+            return 'get', reverse('profile', args=[username]), {}
+        if name == 'post_view':
+            return 'get', reverse('post', args=rnd.choice(self.posts)), {}
+        if name == 'follow_index':
+            return 'get', reverse('follow_index'), self.page()
+        if name == 'new_post':
+            return 'post', reverse('new_post'), {'text': 'нагрузка'}
+        if name == 'add_comment':
+            return ('post', reverse('add_comment', args=rnd.choice(self.posts)),
+                    {'text': 'нагрузка'})
+        if name == 'post_edit':
+            args = [self.viewer.username, self.own_post]
+            return ('post', reverse('post_edit', args=args),
+                    {'text': f'правка {rnd.random()}'})
+        if name == 'profile_follow':
+            username = rnd.choice(self.usernames)
+            return 'get', reverse('profile_follow', args=[username]), {}
+        raise ValueError(name)
+
+
+def percentile(values, percent):
+    from yatube import metrics
+    return metrics.percentile(values, percent) if values else None
+
+
+def summarize(timings, queries, errors, elapsed):
+    return {
+        'requests': len(timings),
+        'errors': errors,
+        'rps': len(timings) / elapsed if elapsed else None,
+        'latency_ms': {
+            f'p{percent}': percentile(timings, percent) * 1000
+            for percent in (50, 95, 99)
+        } if timings else None,
+        'queries': {
+            'p50': percentile(queries, 50),
+            'max': max(queries),
+        } if queries else None,
+    }
+
+
+def run_client(names, requests, rnd):
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+
+    targets = Targets(rnd)
+    anonymous = Client()
+    viewer = Client()
+    viewer.force_login(targets.viewer)
+    results = {}
+    for name in filter(targets.available, names):
+        client = viewer if name in WRITES or name == 'follow_index' \
+            else anonymous
+        timings, queries, errors = [], [], 0
+        started = time.perf_counter()
+        for _ in range(requests):
+            method, url, data = targets.request(name)
+            with CaptureQueriesContext(connection) as captured:
+                begin = time.perf_counter()
+                response = getattr(client, method)(url, data)
+                timings.append(time.perf_counter() - begin)
+            queries.append(len(captured))
+            errors += response.status_code >= 400
+        elapsed = time.perf_counter() - started
+        results[name] = summarize(timings, queries, errors, elapsed)
+    return results
+
+
+def run_http(base_url, names, requests, concurrency, rnd):
+    from urllib.parse import urlencode
+
+    targets = Targets(rnd)
+
+    def fetch(url):
+        begin = time.perf_counter()
+        try:
+            with urllib.request.urlopen(url) as response:
+                response.read()
+                failed = False
+        except urllib.error.URLError:
+            failed = True
+        return time.perf_counter() - begin, failed
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for name in filter(targets.available, names):
+            urls = []
+            for _ in range(requests):
+                _, path, data = targets.request(name)
+                query = f'?{urlencode(data)}' if data else ''
+                urls.append(base_url.rstrip('/') + path + query)
+            started = time.perf_counter()
+            outcomes = list(pool.map(fetch, urls))
+            elapsed = time.perf_counter() - started
+            results[name] = summarize(
+                [seconds for seconds, _ in outcomes], [],
+                sum(failed for _, failed in outcomes), elapsed)
+    return results
+
+
+def compare(report, baseline):
+    print(f'{"":16}{"rps":>20}{"p95, ms":>22}{"запросов p50":>18}')
+    for name, result in report['results'].items():
+        old = baseline['results'].get(name)
+        if not old or not result['latency_ms']:
+            continue
+
+        def pair(new, was, digits=1):
+            if new is None or was is None:
+                return f'{"-":>20}'
+            change = (new - was) / was * 100 if was else 0
+            return f'{was:8.{digits}f} → {new:8.{digits}f} ({change:+4.0f}%)'
+
+        queries = result['queries'] or {}
+        old_queries = old['queries'] or {}
+        print(f'{name:16}{pair(result["rps"], old["rps"])}  '
+              f'{pair(result["latency_ms"]["p95"], old["latency_ms"]["p95"], 2)}'
+              f'  {old_queries.get("p50")} → {queries.get("p50")}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--groups', type=int, default=20)
+    parser.add_argument('--posts', type=int, default=10000)
+    parser.add_argument('--comments', type=int, default=20000)
+    parser.add_argument('--follows', type=int, default=5000)
+    parser.add_argument('--requests', type=int, default=200,
+                        help='Запросов на каждый сценарий')
+    parser.add_argument('--only', nargs='+', choices=READS + WRITES,
+                        help='Прогнать только эти сценарии')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Отключить кэш (DummyCache) в режиме клиента')
+    parser.add_argument('--url', help='Адрес запущенного сервера')
+    parser.add_argument('--concurrency', type=int, default=4,
+                        help='Параллельных запросов в режиме --url')
+    parser.add_argument('--output', '-o', help='Куда записать JSON-отчёт')
+    parser.add_argument('--compare', help='Сравнить с прошлым отчётом')
+    args = parser.parse_args(argv)
+
+    setup()
+    from django.conf import settings
+    from django.test.utils import override_settings
+
+    rnd = random.Random(0)
+    dataset = {key: getattr(args, key)
+               for key in ('users', 'groups', 'posts', 'comments', 'follows')}
+    names = args.only or READS + WRITES
+    if args.url:
+        names = [name for name in names if name in READS
+                 and name != 'follow_index']
+        results = run_http(args.url, names, args.requests,
+                           args.concurrency, rnd)
+        dataset = None
+    else:
+        # как в тестах: без DEBUG и его накопления SQL в connection.queries
+        settings.DEBUG = False
+        caches = {'default': {
+            'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+        with test_database(), \
+                override_settings(**({'CACHES': caches}
+                                     if args.no_cache else {})):
+            seed(**dataset)
+            results = run_client(names, args.requests, rnd)
+
+    report = {
+        'meta': {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'mode': 'http' if args.url else 'client',
+            'url': args.url,
+            'concurrency': args.concurrency if args.url else 1,
+            'requests': args.requests,
+            'dataset': dataset,
+            'cache': not args.no_cache,
+            'python': platform.python_version(),
+            'settings': {key: getattr(settings, key) for key in (
+                'POSTS_PAGINATION', 'POSTS_PAGINATION_COUNT',
+                'POSTS_TIMELINE', 'POSTS_SEARCH_BACKEND')},
+        },
+        'results': results,
+    }
+    for name, result in results.items():
+        latency = result['latency_ms'] or {}
+        queries = result['queries'] or {}
+        print(f'{name:16} {result["rps"] or 0:8.1f} rps  '
+              f'p50 {latency.get("p50", 0):7.2f}  '
+              f'p95 {latency.get("p95", 0):7.2f}  '
+              f'p99 {latency.get("p99", 0):7.2f} ms  '
+              f'запросов {queries.get("p50", "-")}  '
+              f'ошибок {result["errors"]}')
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+    if args.compare:
+        with open(args.compare) as file:
+            compare(report, json.load(file))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
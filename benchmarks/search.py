@@ -0,0 +1,63 @@
+"""Сравнивает поиск по индексу FTS5 с LIKE-просмотром таблицы постов.
+
+    python -m benchmarks.search --posts 50000
+"""
+import argparse
+import random
+import sys
+
+from benchmarks.common import setup, test_database, timed
+
+WORDS = ('котик собака погода город море лес книга музыка кофе дорога '
+         'утро вечер праздник работа отпуск поезд река гора сад дождь').split()
+
+
+def seed(posts, users):
+    from django.contrib.auth import get_user_model
+    from posts import search
+    from posts.models import Post
+
+    User = get_user_model()
+    rnd = random.Random(0)
+    # редкие слова, чтобы в замерах были и узкие, и широкие запросы
+    vocabulary = WORDS + [f'слово{i}' for i in range(5000)]
+    User.objects.bulk_create(
+        (User(username=f'user_{i}') for i in range(users)), batch_size=500)
+    user_ids = list(User.objects.values_list('pk', flat=True))
+    Post.objects.bulk_create(
+        (Post(text=' '.join(rnd.choices(vocabulary, k=rnd.randint(5, 60))),
+              author_id=rnd.choice(user_ids))
+         for _ in range(posts)),
+        batch_size=500,
+    )
+    return search.Fts5Backend().rebuild()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--posts', type=int, default=20000)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--per-page', type=int, default=10)
+    args = parser.parse_args(argv)
+
+    setup()
+    from posts import search
+
+    queries = ['котик', 'котик море', 'слово4217', 'слово1', 'нет']
+    backends = {'fts5': search.Fts5Backend(), 'like': search.LikeBackend()}
+    with test_database():
+        indexed = seed(args.posts, args.users)
+        print(f'Постов в индексе: {indexed}')
+        for query in queries:
+            for name, backend in backends.items():
+                def run():
+                    results = backend.search(query)
+                    return results.count(), results[:args.per_page]
+                seconds = timed(run)
+                print(f'{query:18} {name:5} {seconds * 1000:8.2f} ms  '
+                      f'найдено {run()[0]}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
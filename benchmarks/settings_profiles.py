@@ -0,0 +1,122 @@
+"""Сравнивает время ответа страниц в профилях настроек development и
+production.
+
+Создаёт временную базу, заполняет её generate_dataset и по очереди
+поднимает runserver с каждым профилем, гоняя по нему benchmarks.load
+по HTTP. Сервер однопоточный: в многопоточном runserver каждый запрос
+обслуживает новый поток со своим соединением, и CONN_MAX_AGE ничего бы
+не давал.
+
+    python -m benchmarks.settings_profiles --posts 20000 --requests 300
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+from benchmarks.common import BASE_DIR
+
+PROFILES = ('development', 'production')
+RUNS = ('cold', 'warm')
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def manage(env, *args):
+    subprocess.run([sys.executable, 'manage.py', *args], cwd=BASE_DIR,
+                   env=env, check=True, stdout=subprocess.DEVNULL)
+
+
+def wait_until_up(url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(url).close()
+            return
+        except urllib.error.HTTPError:
+            raise
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'Сервер {url} не поднялся')
+
+
+def run_profile(profile, env, args, directory):
+    env = dict(env, YATUBE_ENV=profile)
+    port = free_port()
+    url = f'http://127.0.0.1:{port}'
+    results = {}
+    server = subprocess.Popen(
+        [sys.executable, 'manage.py', 'runserver', f'127.0.0.1:{port}',
+         '--noreload', '--nothreading'],
+        cwd=BASE_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_until_up(url + '/')
+        # второй проход повторяет те же адреса: кэш и шаблоны уже прогреты
+        for run in RUNS:
+            report = os.path.join(directory, f'{profile}-{run}.json')
+            subprocess.run(
+                [sys.executable, '-m', 'benchmarks.load', '--url', url,
+                 '--concurrency', '1', '--requests', str(args.requests),
+                 '-o', report],
+                cwd=BASE_DIR, env=env, check=True, stdout=subprocess.DEVNULL,
+            )
+            with open(report) as file:
+                results[run] = json.load(file)['results']
+    finally:
+        server.terminate()
+        server.wait()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--posts', type=int, default=10000)
+    parser.add_argument('--comments', type=int, default=20000)
+    parser.add_argument('--follows', type=int, default=5000)
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(
+            os.environ,
+            DJANGO_SETTINGS_MODULE='yatube.settings',
+            YATUBE_DATABASE_NAME=os.path.join(directory, 'db.sqlite3'),
+            YATUBE_SECRET_KEY='benchmark',
+            YATUBE_ALLOWED_HOSTS='127.0.0.1',
+        )
+        manage(env, 'migrate')
+        manage(dict(env, YATUBE_ENV='production'), 'createcachetable')
+        manage(env, 'generate_dataset', '--users', str(args.users),
+               '--posts', str(args.posts), '--comments', str(args.comments),
+               '--follows', str(args.follows))
+        results = {profile: run_profile(profile, env, args, directory)
+                   for profile in PROFILES}
+
+    columns = [(run, profile) for run in RUNS for profile in PROFILES]
+    print('p50 / p95, мс' + ''.join(f'{run} {profile:>12}'.rjust(22)
+                                    for run, profile in columns))
+    for name in results[PROFILES[0]][RUNS[0]]:
+        cells = []
+        for run, profile in columns:
+            latency = results[profile][run][name]['latency_ms']
+            cells.append(f'{latency["p50"]:6.2f} / {latency["p95"]:6.2f}')
+        print(f'{name:13}' + ''.join(f'{cell:>22}' for cell in cells))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,151 @@
+"""Чтение страниц во время записи: стандартный sqlite3 против
+yatube.sqlite (WAL, busy_timeout, BEGIN IMMEDIATE).
+
+Создаёт временную базу, заполняет её generate_dataset и для каждого
+профиля запускает процессы-читатели (главная, сообщества, профили,
+посты) — сначала одни, потом вместе с процессами-писателями (новые
+посты и комментарии). Процессы изображают воркеры сервера: у каждого
+своё соединение. Кэш отключён, чтобы чтение шло в базу.
+
+    python -m benchmarks.sqlite_concurrency --readers 4 --writers 4
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.common import BASE_DIR, setup
+
+READS = ('index', 'group_posts', 'profile', 'post_view')
+WRITES = ('new_post', 'add_comment')
+PROFILES = {
+    'sqlite3': {'ENGINE': 'django.db.backends.sqlite3', 'OPTIONS': {}},
+    'yatube.sqlite': None,  # как в настройках проекта
+}
+
+
+def configure(profile, database):
+    from django.conf import settings
+
+    os.environ['YATUBE_DATABASE_NAME'] = database
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+    if PROFILES[profile]:
+        settings.DATABASES['default'].update(PROFILES[profile])
+    settings.DEBUG = False
+    settings.ALLOWED_HOSTS = ['testserver']
+    settings.CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+    setup()
+
+
+def worker(profile, database, role, number, start_at, seconds, results):
+    from django.db import OperationalError
+
+    configure(profile, database)
+    from django.contrib.auth import get_user_model
+    from django.test import Client
+    from benchmarks.load import Targets
+
+    rnd = random.Random(number)
+    targets = Targets(rnd)
+    client = Client()
+    names = READS
+    if role == 'writer':
+        names = WRITES
+        client.force_login(get_user_model().objects.order_by('pk')[number])
+
+    timings, errors = [], 0
+    time.sleep(max(0, start_at - time.time()))
+    deadline = start_at + seconds
+    while time.time() < deadline:
+        method, url, data = targets.request(rnd.choice(names))
+        begin = time.perf_counter()
+        try:
+            response = getattr(client, method)(url, data)
+            errors += response.status_code >= 400
+        except OperationalError:
+            # «database is locked»
+            errors += 1
+            continue
+        timings.append(time.perf_counter() - begin)
+    results.put((role, timings, errors))
+
+
+def run(profile, database, readers, writers, seconds):
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    # время на запуск Django в каждом процессе
+    start_at = time.time() + 3
+    roles = [('reader', i) for i in range(readers)]
+    roles += [('writer', i) for i in range(writers)]
+    processes = [
+        context.Process(target=worker, args=(profile, database, role, number,
+                                              start_at, seconds, results))
+        for role, number in roles
+    ]
+    for process in processes:
+        process.start()
+    collected = {'reader': ([], 0), 'writer': ([], 0)}
+    for _ in processes:
+        role, timings, errors = results.get()
+        done, failed = collected[role]
+        collected[role] = (done + timings, failed + errors)
+    for process in processes:
+        process.join()
+    return collected
+
+
+def summary(timings, errors, seconds):
+    from yatube import metrics
+
+    if not timings:
+        return f'{"-":>8} {"-":>8} {errors:>7}'
+    p95 = metrics.percentile(timings, 95) * 1000
+    return f'{len(timings) / seconds:8.1f} {p95:8.2f} {errors:>7}'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--posts', type=int, default=10000)
+    parser.add_argument('--comments', type=int, default=20000)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=10)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        database = os.path.join(directory, 'db.sqlite3')
+        env = dict(os.environ, YATUBE_DATABASE_NAME=database)
+        for command in (['migrate'],
+                        ['generate_dataset', '--users', str(args.users),
+                         '--posts', str(args.posts),
+                         '--comments', str(args.comments)]):
+            subprocess.run([sys.executable, 'manage.py', *command],
+                           cwd=BASE_DIR, env=env, check=True,
+                           stdout=subprocess.DEVNULL)
+
+        print(f'{"":15}{"писателей":>10}{"чтений/с":>10}{"p95, мс":>9}'
+              f'{"ошибок":>8}{"записей/с":>11}{"p95, мс":>9}{"ошибок":>8}')
+        for profile in PROFILES:
+            if PROFILES[profile]:
+                # WAL запоминается в файле базы: возвращаем обычный журнал
+                with sqlite3.connect(database) as conn:
+                    conn.execute('PRAGMA journal_mode = delete')
+            for writers in (0, args.writers):
+                collected = run(profile, database, args.readers, writers,
+                                args.seconds)
+                reads = summary(*collected['reader'], args.seconds)
+                writes = summary(*collected['writer'], args.seconds)
+                print(f'{profile:15}{writers:>10}  {reads}   {writes}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
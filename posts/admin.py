@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Post, Group, Comment, Follow
+from .models import Post, Group, Comment, Follow, Task
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -33,4 +33,13 @@ class FollowAdmin(admin.ModelAdmin):
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group, GroupAdmin)
 admin.site.register(Comment,CommentAdmin)
-admin.site.register(Follow,FollowAdmin)
\ No newline at end of file
+admin.site.register(Follow,FollowAdmin)
+
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ("pk", "name", "status", "attempts", "run_at", "key")
+    search_fields = ("name", "key")
+    list_filter = ("status", "name")
+    empty_value_display = "-пусто-"
+
+
+admin.site.register(Task, TaskAdmin)
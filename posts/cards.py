@@ -0,0 +1,56 @@
+"""Кэш отрисованных карточек постов (includes/post_item.html).
+
+Ключ меняется вместе с постом: в нём время изменения и число
+комментариев, поэтому правка поста и новый комментарий сами дают новый
+ключ, а старые записи просто вытесняются. Имя автора и название
+сообщества в карточке тоже есть, но в пост не входят: ключ содержит их
+хэш, так что переименование сообщества или автора меняет ключи всех его
+карточек. Зрителей три варианта: гость, пользователь (кнопка
+комментария) и автор (ещё и кнопка правки).
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+
+TEMPLATE = 'includes/post_item.html'
+
+
+def variant(post, user):
+    if not user.is_authenticated:
+        return 'anon'
+    return 'author' if user.pk == post.author_id else 'user'
+
+
+def related_version(post):
+    """Хэш того, что карточка показывает об авторе и сообществе."""
+    group = post.group
+    shown = [post.author.username]
+    if group is not None:
+        shown += [group.slug, group.title]
+    return hashlib.md5('\0'.join(shown).encode()).hexdigest()[:12]
+
+
+def card_key(post, user):
+    return (f'post_card:{post.pk}:{post.updated.timestamp()}:'
+            f'{post.comment_count}:{related_version(post)}:'
+            f'{variant(post, user)}')
+
+
+def render_cards(posts, user):
+    """HTML карточек по порядку: готовые берутся из кэша одним
+    get_many, недостающие рисуются и кладутся одним set_many."""
+    posts = list(posts)
+    keys = [card_key(post, user) for post in posts]
+    cached = cache.get_many(keys)
+    missing = {}
+    template = get_template(TEMPLATE)
+    for post, key in zip(posts, keys):
+        if key not in cached:
+            missing[key] = template.render({'post': post, 'user': user})
+    if missing:
+        cache.set_many(missing, settings.POSTS_CARD_CACHE_TIMEOUT)
+        cached.update(missing)
+    return mark_safe(''.join(cached[key] for key in keys))
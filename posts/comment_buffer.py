@@ -0,0 +1,196 @@
+"""Отложенная запись комментариев (POSTS_COMMENT_BUFFER).
+
+В пики каждый комментарий — отдельный INSERT в транзакции запроса, и
+воркеры выстраиваются в очередь за блокировкой записи SQLite. С
+включённым буфером запрос только дописывает строку JSON в файл (одним
+os.write и с fsync, так что принятый комментарий переживёт падение
+процесса), а manage.py flush_comment_buffer забирает накопленное и
+вставляет одним bulk_create.
+
+Забирая файл, сброс переименовывает его и ждёт исключительной flock:
+писатели держат разделяемую, так что начатые дозаписи успевают
+закончиться, а опоздавшие замечают, что файл уже другой, и открывают
+новый. У каждой записи есть buffer_key, уникальный в posts_comment:
+сброс, упавший между вставкой и удалением файла, можно повторить.
+
+Пока комментарий в буфере, автор видит его под постом: submit кладёт
+запись ещё и в кэш, а сброс её оттуда убирает.
+"""
+import fcntl
+import glob
+import json
+import logging
+import os
+import time
+import uuid
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import comment_cache, counters, feed_cache
+from .models import Comment, Post
+from .ndjson import bulk_insert
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+PENDING = 'pending.jsonl'
+FLUSHING = 'flushing-{}.jsonl'
+OVERLAY_KEY = 'comment_buffer:{}:{}'
+
+
+def enabled():
+    return settings.POSTS_COMMENT_BUFFER
+
+
+def _directory():
+    path = settings.POSTS_COMMENT_BUFFER_DIR
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _append(line):
+    path = os.path.join(_directory(), PENDING)
+    while True:
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_SH)
+            try:
+                current = os.stat(path).st_ino
+            except FileNotFoundError:
+                current = None
+            if current != os.fstat(fd).st_ino:
+                # файл забрал сброс, пока мы ждали блокировку
+                continue
+            os.write(fd, line)
+            if settings.POSTS_COMMENT_BUFFER_FSYNC:
+                os.fsync(fd)
+            return
+        finally:
+            os.close(fd)
+
+
+def _overlay_key(post_id, user_id):
+    return OVERLAY_KEY.format(post_id, user_id)
+
+
+def submit(post_id, author, text):
+    record = {
+        'key': uuid.uuid4().hex,
+        'post': post_id,
+        'author': author.pk,
+        'text': text,
+        'created': timezone.now().isoformat(),
+    }
+    _append((json.dumps(record, ensure_ascii=False) + '\n').encode())
+    key = _overlay_key(post_id, author.pk)
+    pending = cache.get(key, [])
+    pending.append(record)
+    cache.set(key, pending, settings.POSTS_COMMENT_BUFFER_OVERLAY_TIMEOUT)
+    return record
+
+
+def _overlay(user, post_id):
+    if not user.is_authenticated:
+        return []
+    return cache.get(_overlay_key(post_id, user.pk), [])
+
+
+def pending_for(user, post_id):
+    """Ещё не сброшенные комментарии user к посту — Comment без pk."""
+    return [
+        Comment(post_id=post_id, author=user, text=record['text'],
+                created=parse_datetime(record['created']),
+                buffer_key=record['key'])
+        for record in _overlay(user, post_id)
+    ]
+
+
+def overlay_version(user, post_id):
+    """Часть ETag страницы поста: меняется с каждым комментарием
+    зрителя в буфере."""
+    pending = _overlay(user, post_id)
+    return pending[-1]['key'] if pending else ''
+
+
+def flush(batch_size=500):
+    """Переносит буфер в posts_comment и возвращает число записей."""
+    directory = _directory()
+    try:
+        os.replace(os.path.join(directory, PENDING),
+                   os.path.join(directory, FLUSHING.format(time.time_ns())))
+    except FileNotFoundError:
+        pass
+    # вместе с файлами, оставшимися от упавшего сброса
+    paths = sorted(glob.glob(os.path.join(directory, FLUSHING.format('*'))))
+    return sum(_flush_file(path, batch_size) for path in paths)
+
+
+def _flush_file(path, batch_size):
+    records = []
+    with open(path, 'rb') as file:
+        fcntl.flock(file, fcntl.LOCK_EX)
+        for number, line in enumerate(file, 1):
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                logger.warning('Пропущена повреждённая строка %s:%s',
+                               path, number)
+    for start in range(0, len(records), batch_size):
+        _insert(records[start:start + batch_size])
+    os.remove(path)
+    return len(records)
+
+
+def _insert(records):
+    posts = dict(Post.objects.filter(
+        pk__in={record['post'] for record in records}
+    ).values_list('pk', 'group_id'))
+    authors = set(User.objects.filter(
+        pk__in={record['author'] for record in records}
+    ).values_list('pk', flat=True))
+    comments = [
+        Comment(post_id=record['post'], author_id=record['author'],
+                text=record['text'],
+                created=parse_datetime(record['created']),
+                buffer_key=record['key'])
+        for record in records
+        if record['post'] in posts and record['author'] in authors
+    ]
+    if len(comments) < len(records):
+        logger.warning('Пропущено комментариев к удалённым постам или от '
+                       'удалённых пользователей: %s',
+                       len(records) - len(comments))
+    touched = {comment.post_id for comment in comments}
+    with transaction.atomic():
+        bulk_insert(Comment, comments, ignore_conflicts=True)
+        counters.repair(Post.objects.filter(pk__in=touched),
+                        counters.post_counters())
+
+    scopes = set()
+    for post_id, author_id, group_id in Post.objects.filter(
+            pk__in=touched).values_list('pk', 'author_id', 'group_id'):
+        comment_cache.invalidate(post_id)
+        scopes.update(feed_cache.post_scopes(author_id, group_id))
+    feed_cache.bump(*scopes)
+    _clear_overlay(records)
+
+
+def _clear_overlay(records):
+    flushed = {}
+    for record in records:
+        key = _overlay_key(record['post'], record['author'])
+        flushed.setdefault(key, set()).add(record['key'])
+    for key, keys in flushed.items():
+        pending = [record for record in cache.get(key, [])
+                   if record['key'] not in keys]
+        if pending:
+            cache.set(key, pending,
+                      settings.POSTS_COMMENT_BUFFER_OVERLAY_TIMEOUT)
+        else:
+            cache.delete(key)
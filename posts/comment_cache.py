@@ -0,0 +1,54 @@
+"""Первая страница комментариев поста в кэше.
+
+Комментарии показываются по порядку (created, id), новые дописываются в
+конец, поэтому у популярного поста первая страница не меняется вовсе, а
+у нового растёт, пока не наберёт POSTS_COMMENTS_PER_PAGE. Кэш
+обновляется сквозной записью: сохранённый комментарий дописывается в
+закэшированный список, пока тот не заполнится. Правка или удаление
+сбрасывают ключ.
+
+Список сверяется с post.comment_count: если дописывание потерялось
+(гонка двух комментариев, откат транзакции, импорт без сигналов),
+длина не совпадёт, и страница перечитается из базы.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+ORDERING = ('created', 'id')
+
+
+def _limit():
+    # на один больше страницы: так видно, есть ли следующая
+    return settings.POSTS_COMMENTS_PER_PAGE + 1
+
+
+def _key(post_id):
+    return f'comment_thread:{post_id}:{_limit()}'
+
+
+def head(post, comments):
+    """Первые POSTS_COMMENTS_PER_PAGE + 1 комментариев из queryset
+    comments поста post."""
+    limit = _limit()
+    cached = cache.get(_key(post.pk))
+    if cached is not None and len(cached) == min(post.comment_count, limit):
+        return cached
+    cached = list(comments.order_by(*ORDERING)[:limit])
+    cache.set(_key(post.pk), cached, settings.POSTS_COMMENT_CACHE_TIMEOUT)
+    return cached
+
+
+def append(comment):
+    key = _key(comment.post_id)
+    cached = cache.get(key)
+    if cached is None or len(cached) >= _limit():
+        # заполнять пустой ключ — дело чтения, а полную страницу
+        # новый комментарий не меняет
+        return
+    comment.author  # в кэш комментарий попадает вместе с автором
+    cached.append(comment)
+    cache.set(key, cached, settings.POSTS_COMMENT_CACHE_TIMEOUT)
+
+
+def invalidate(post_id):
+    cache.delete(_key(post_id))
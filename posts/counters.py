@@ -0,0 +1,72 @@
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from users.models import Profile
+from .models import Comment, Follow, Post
+
+User = get_user_model()
+
+
+def increment(queryset, field, delta=1):
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    return queryset.update(**{field: F(field) + delta})
+
+
+def post_changed(post, delta):
+    increment(Profile.objects.filter(user_id=post.author_id),
+              'posts_count', delta)
+
+
+def comment_changed(comment, delta):
+    increment(Post.objects.filter(pk=comment.post_id), 'comment_count', delta)
+
+
+def follow_changed(follow, delta):
+    increment(Profile.objects.filter(user_id=follow.author_id),
+              'followers_count', delta)
+    increment(Profile.objects.filter(user_id=follow.user_id),
+              'following_count', delta)
+
+
+def count_of(model, field, outer='pk'):
+    counted = (model.objects.filter(**{field: OuterRef(outer)})
+               .order_by()
+               .values(field)
+               .annotate(total=Count('pk'))
+               .values('total'))
+    return Coalesce(Subquery(counted, output_field=IntegerField()), 0)
+
+
+def post_counters():
+    return {'comment_count': count_of(Comment, 'post')}
+
+
+def profile_counters():
+    return {
+        'posts_count': count_of(Post, 'author', 'user_id'),
+        'followers_count': count_of(Follow, 'author', 'user_id'),
+        'following_count': count_of(Follow, 'user', 'user_id'),
+    }
+
+
+def create_missing_profiles(users=None, batch_size=1000):
+    users = User.objects.all() if users is None else users
+    missing = users.filter(profile__isnull=True).values_list(
+        'pk', flat=True)
+    profiles = [Profile(user_id=pk) for pk in missing.iterator()]
+    Profile.objects.bulk_create(profiles, batch_size=batch_size)
+    return len(profiles)
+
+
+def repair(queryset, counters, fix=True):
+    """Возвращает число строк, где счётчики разошлись с реальными
+    значениями, и при fix=True исправляет их одним UPDATE."""
+    drift = Q()
+    for field, value in counters.items():
+        drift |= ~Q(**{field: value})
+    drifted = queryset.filter(drift)
+    if fix:
+        return drifted.update(**counters)
+    return drifted.count()
@@ -0,0 +1,251 @@
+"""Синтетические данные для нагрузочных прогонов.
+
+Активность авторов распределена по степенному закону: вес автора с
+номером k пропорционален 1 / k ** alpha, поэтому немногие авторы пишут
+большую часть постов и собирают большую часть подписчиков. Всё
+определяется seed: одинаковые параметры дают одинаковую базу. Даты
+тоже: посты распределяются по days дням до end (по умолчанию END), а не
+до момента запуска, иначе два прогона с одним seed различались бы.
+
+Пользователи, профили и сообщества создаются через bulk_create. Посты,
+комментарии и подписки — основной объём — вставляются executemany
+готовых кортежей: сборка SQL для каждого объекта в bulk_create
+ограничивала генерацию несколькими тысячами строк в секунду. Id
+пользователей и постов не загружаются в память: свежие строки получают
+идущие подряд id, и случайные ссылки выбираются из диапазона.
+"""
+import contextlib
+import datetime as dt
+import itertools
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import Max, Min
+
+from users.models import Profile
+from . import counters, feed_cache, search, timeline
+from .models import Comment, Follow, Group, Post
+
+END = dt.datetime(2026, 1, 1, tzinfo=dt.timezone.utc)
+
+User = get_user_model()
+
+WORDS = ('котик собака погода город море лес книга музыка кофе дорога '
+         'утро вечер праздник работа отпуск поезд река гора сад дождь '
+         'снег солнце друг дом окно чай фильм игра школа лето').split()
+
+# на SQLite в одном INSERT не больше 500 строк (SQLITE_MAX_COMPOUND_SELECT)
+SQLITE_MAX_ROWS = 500
+TEXTS = 10000
+
+
+def power_law_index(rnd, size, alpha):
+    """Номер от 0 до size - 1; плотность убывает как 1 / x ** alpha.
+    Обратная функция распределения, поэтому без таблицы весов."""
+    u = rnd.random()
+    if alpha == 1:
+        x = (size + 1) ** u
+    else:
+        x = (((size + 1) ** (1 - alpha) - 1) * u + 1) ** (1 / (1 - alpha))
+    return min(int(x), size) - 1
+
+
+@contextlib.contextmanager
+def fast_writes():
+    """На SQLite не ждать fsync после каждой транзакции (сбой посреди
+    генерации не страшен, базу проще создать заново) и держать индексы
+    в большом кэше страниц: вставки в них идут вразброс."""
+    if connection.vendor != 'sqlite':
+        yield
+        return
+    pragmas = {'synchronous': 0, 'cache_size': -256 * 1024}
+    if connection.in_atomic_block:
+        # внутри транзакции SQLite не даёт менять synchronous
+        del pragmas['synchronous']
+    with connection.cursor() as cursor:
+        previous = {}
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}')
+            previous[name] = cursor.fetchone()[0]
+            cursor.execute(f'PRAGMA {name} = {value}')
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            for name, value in previous.items():
+                cursor.execute(f'PRAGMA {name} = {int(value)}')
+
+
+class Generator:
+    def __init__(self, seed=0, alpha=1.1, days=365, batch_size=5000,
+                 prefix='user_', progress=None, end=None):
+        self.rnd = random.Random(seed)
+        self.alpha = alpha
+        self.days = days
+        self.end = end or END
+        self.batch_size = batch_size
+        self.insert_size = batch_size
+        if connection.vendor == 'sqlite':
+            self.insert_size = min(batch_size, SQLITE_MAX_ROWS)
+        self.prefix = prefix
+        self.progress = progress or (lambda *args: None)
+        self.users = self.posts = self.groups = range(0)
+
+    def _bulk(self, model, objects, total, **kwargs):
+        """Вставляет объекты пачками по транзакции на пачку и сообщает
+        о ходе работы."""
+        started = time.perf_counter()
+        done = 0
+        objects = iter(objects)
+        while True:
+            batch = list(itertools.islice(objects, self.batch_size))
+            if not batch:
+                break
+            with transaction.atomic():
+                model.objects.bulk_create(batch, batch_size=self.insert_size,
+                                          **kwargs)
+            done += len(batch)
+            self.progress(model._meta.verbose_name_plural, done, total,
+                          time.perf_counter() - started)
+
+    def _insert(self, model, fields, rows, total, ignore_conflicts=False):
+        """То же, что _bulk, но для кортежей значений полей fields."""
+        ops = connection.ops
+        columns = ', '.join(ops.quote_name(model._meta.get_field(name).column)
+                            for name in fields)
+        sql = (f'{ops.insert_statement(ignore_conflicts=ignore_conflicts)} '
+               f'{ops.quote_name(model._meta.db_table)} ({columns}) '
+               f'VALUES ({", ".join(["%s"] * len(fields))}) '
+               f'{ops.ignore_conflicts_suffix_sql(ignore_conflicts)}')
+        started = time.perf_counter()
+        done = 0
+        rows = iter(rows)
+        while True:
+            batch = list(itertools.islice(rows, self.batch_size))
+            if not batch:
+                break
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.executemany(sql, batch)
+            done += len(batch)
+            self.progress(model._meta.verbose_name_plural, done, total,
+                          time.perf_counter() - started)
+
+    def _moment(self, value):
+        return connection.ops.adapt_datetimefield_value(value)
+
+    def _new_ids(self, queryset, before):
+        """Диапазон id строк, вставленных после before."""
+        created = queryset.filter(pk__gt=before)
+        bounds = created.aggregate(first=Min('pk'), last=Max('pk'))
+        if bounds['first'] is None:
+            return range(0)
+        ids = range(bounds['first'], bounds['last'] + 1)
+        if created.count() != len(ids):
+            # id с пропусками: дешевле загрузить, чем промахиваться
+            return list(created.order_by('pk').values_list('pk', flat=True))
+        return ids
+
+    def _last_id(self, model):
+        return model.objects.aggregate(last=Max('pk'))['last'] or 0
+
+    def _author(self):
+        return self.users[power_law_index(self.rnd, len(self.users),
+                                          self.alpha)]
+
+    def make_users(self, count):
+        if User.objects.filter(username__startswith=self.prefix).exists():
+            raise ValueError(f'Пользователи с префиксом {self.prefix!r} '
+                             f'уже есть')
+        before = self._last_id(User)
+        self._bulk(User, (User(username=f'{self.prefix}{i}', password='!')
+                          for i in range(count)), count)
+        self.users = self._new_ids(User.objects.all(), before)
+        self._bulk(Profile, (Profile(user_id=pk) for pk in self.users),
+                   len(self.users))
+
+    def make_groups(self, count):
+        slug = self.prefix.replace('_', '-') + '{}'
+        if len(slug.format(count)) > Group._meta.get_field('slug').max_length:
+            raise ValueError(f'Слишком длинный префикс {self.prefix!r}')
+        before = self._last_id(Group)
+        self._bulk(Group, (Group(title=f'Сообщество {i}',
+                                 slug=slug.format(i),
+                                 description='')
+                           for i in range(count)), count)
+        self.groups = self._new_ids(Group.objects.all(), before)
+
+    def _text(self):
+        if not hasattr(self, 'texts'):
+            self.texts = [
+                ' '.join(self.rnd.choices(WORDS, k=self.rnd.randint(3, 60)))
+                for _ in range(TEXTS)
+            ]
+        return self.rnd.choice(self.texts)
+
+    def make_posts(self, count):
+        self.start = self.end - dt.timedelta(days=self.days)
+        self.step = dt.timedelta(days=self.days) / max(count, 1)
+        groups = list(self.groups) + [None] * max(1, len(self.groups) // 2)
+
+        def posts():
+            for i in range(count):
+                moment = self._moment(self.start + self.step * i)
+                yield (self._text(), moment, moment, self._author(),
+                       self.rnd.choice(groups), 0)
+
+        before = self._last_id(Post)
+        self._insert(Post, ('text', 'pub_date', 'updated', 'author', 'group',
+                            'comment_count'), posts(), count)
+        self.posts = self._new_ids(Post.objects.all(), before)
+
+    def make_comments(self, count):
+        if not self.posts:
+            return
+
+        def comments():
+            for _ in range(count):
+                index = self.rnd.randrange(len(self.posts))
+                delay = dt.timedelta(minutes=self.rnd.expovariate(1 / 120))
+                created = min(self.end,
+                              self.start + self.step * index + delay)
+                yield (self.posts[index], self._author(), self._text(),
+                       self._moment(created))
+
+        self._insert(Comment, ('post', 'author', 'text', 'created'),
+                     comments(), count)
+
+    def make_follows(self, count):
+        def follows():
+            for _ in range(count):
+                user = self.rnd.choice(self.users)
+                author = self._author()
+                if user != author:
+                    yield user, author
+
+        # повторные пары отбрасывает уникальное ограничение
+        self._insert(Follow, ('user', 'author'), follows(), count,
+                     ignore_conflicts=True)
+
+    def finish(self):
+        """bulk_create не шлёт сигналов: пересчитываем то, что обычно
+        поддерживают обработчики."""
+        users = User.objects.filter(username__startswith=self.prefix)
+        counters.repair(Post.objects.filter(author__in=users),
+                        counters.post_counters())
+        counters.repair(Profile.objects.filter(user__in=users),
+                        counters.profile_counters())
+        search.backend().rebuild()
+        if timeline.enabled():
+            timeline.rebuild(users)
+        feed_cache.bump(feed_cache.index_scope())
+
+    def generate(self, users, groups, posts, comments, follows):
+        with fast_writes():
+            self.make_users(users)
+            self.make_groups(groups)
+            self.make_posts(posts)
+            self.make_comments(comments)
+            self.make_follows(follows)
+        self.finish()
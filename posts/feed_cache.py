@@ -0,0 +1,73 @@
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.crypto import salted_hmac
+
+from yatube import replicas
+
+GENERATION_KEY = 'feed:generation:%s'
+
+
+def _new_generation():
+    # Поколение — момент последнего изменения в наносекундах: после
+    # вытеснения или истечения ключа оно не совпадёт со старым, а по нему
+    # видно, успела ли реплика получить изменение.
+    return time.time_ns()
+
+
+def _cache():
+    return caches[settings.POSTS_GENERATION_CACHE]
+
+
+def generation(scope):
+    key = GENERATION_KEY % scope
+    cache = _cache()
+    value = cache.get(key)
+    if value is None:
+        cache.add(key, _new_generation(), settings.POSTS_FEED_CACHE_TIMEOUT)
+        value = cache.get(key, 0)
+    return value
+
+
+def bump(*scopes):
+    cache = _cache()
+    for scope in scopes:
+        cache.set(GENERATION_KEY % scope, _new_generation(),
+                  settings.POSTS_FEED_CACHE_TIMEOUT)
+
+
+def index_scope():
+    return 'index'
+
+
+def group_scope(group_id):
+    return f'group:{group_id}'
+
+
+def profile_scope(author_id):
+    return f'profile:{author_id}'
+
+
+def post_scopes(author_id, *group_ids):
+    scopes = [index_scope(), profile_scope(author_id)]
+    scopes += [group_scope(pk) for pk in set(group_ids) if pk is not None]
+    return scopes
+
+
+def viewer_key(user):
+    """Вариант ленты для зрителя. Ключ уходит клиенту в ETag, поэтому pk
+    пользователя в нём не виден."""
+    if not user.is_authenticated:
+        return 'anon'
+    return salted_hmac('posts.feed_cache.viewer', user.pk).hexdigest()[:16]
+
+
+def fragment_key(request, scope, page='1'):
+    """Часть ключа кэша ленты: поколение, страница или курсор и вариант
+    для зрителя (кнопки комментирования и редактирования). Страницу
+    передаёт вызывающий уже проверенной (см. views.page_key)."""
+    value = generation(scope)
+    # иначе отстающая реплика закэширует старую ленту под новым ключом
+    replicas.primary_if_changed_since(value / 1e9)
+    return f'{scope}:{value}:{page}:{viewer_key(request.user)}'
@@ -1,6 +1,10 @@
 from django import forms
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
 from django.forms import ModelForm
+from PIL import Image
 from .models import Post, Comment
+from . import images
 
 
 class PostForm(forms.ModelForm):
@@ -14,6 +18,25 @@ class PostForm(forms.ModelForm):
                       'text': 'Любой текст',
                       'image': 'Любой файл'}
 
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        if not isinstance(image, UploadedFile):
+            # картинка не менялась
+            return image
+        # размеры есть в заголовке, сама картинка ещё не декодирована
+        width, height = image.image.size
+        if width * height > settings.POSTS_IMAGE_MAX_PIXELS:
+            raise forms.ValidationError(
+                'Слишком большая картинка: %(width)s×%(height)s',
+                code='too_large', params={'width': width, 'height': height})
+        try:
+            return images.process(image)
+        except (OSError, Image.DecompressionBombError):
+            # заголовок прошёл проверку ImageField, а данные битые
+            raise forms.ValidationError(
+                'Не удалось прочитать картинку: файл повреждён',
+                code='invalid_image')
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
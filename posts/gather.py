@@ -0,0 +1,62 @@
+"""Независимые запросы одной страницы выполняются параллельно.
+
+В Django 2.2 нет асинхронных представлений, поэтому вместо await
+asyncio.gather() запросы, которые не зависят друг от друга (число постов
+для пагинатора и проверка подписки в профиле), уходят в общий пул
+потоков, каждый поток — со своим соединением. Пока поток ждёт ответа
+БД, GIL свободен (sqlite3 тоже отпускает его на время запроса), так что
+задержки складываются не в сумму, а в максимум.
+
+Поток пула читает с той же реплики, что и запрос, и его SQL-запросы
+засчитываются в метрики и бюджет запроса. Тесты выключают пул
+(POSTS_GATHER_WORKERS = 0): in-memory SQLite из другого соединения не
+видна.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections
+
+from yatube import metrics, replicas
+
+_executor = None
+_lock = threading.Lock()
+
+
+def executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.POSTS_GATHER_WORKERS,
+                thread_name_prefix='gather',
+            )
+        return _executor
+
+
+def _in_request_context(func):
+    sample = metrics.current_sample()
+    replica = replicas.current()
+
+    def run():
+        try:
+            with metrics.counted_in(sample), replicas.reading_from(replica):
+                return func()
+        finally:
+            # соединение живёт, пока жив поток пула; закрываем сломанные
+            for connection in connections.all():
+                if connection.errors_occurred and not connection.is_usable():
+                    connection.close()
+    return run
+
+
+def gather(*funcs):
+    """Вызывает funcs и возвращает их результаты в том же порядке.
+    Первая функция выполняется в текущем потоке, остальные — в пуле."""
+    if settings.POSTS_GATHER_WORKERS == 0 or len(funcs) < 2:
+        return [func() for func in funcs]
+    futures = [executor().submit(_in_request_context(func))
+               for func in funcs[1:]]
+    first = funcs[0]()
+    return [first] + [future.result() for future in futures]
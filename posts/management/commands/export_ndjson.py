@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import ndjson
+
+
+class Command(BaseCommand):
+    help = 'Выгружает посты, комментарии или подписки в NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('table', choices=sorted(ndjson.TABLES))
+        parser.add_argument('--output', '-o',
+                            help='Файл; .gz сжимается. По умолчанию stdout')
+        parser.add_argument('--gzip', action='store_true',
+                            help='Сжать вывод gzip')
+        parser.add_argument('--author', help='username автора')
+        parser.add_argument('--group', help='slug сообщества')
+        parser.add_argument('--since', help='Не раньше даты (ISO 8601)')
+        parser.add_argument('--until', help='Не позже даты (ISO 8601)')
+        parser.add_argument('--chunk-size', type=int,
+                            default=ndjson.CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            rows = ndjson.rows(options['table'],
+                               author=options['author'],
+                               group=options['group'],
+                               since=options['since'],
+                               until=options['until'],
+                               chunk_size=options['chunk_size'])
+        except ValueError as e:
+            raise CommandError(e)
+        content = ndjson.buffered(ndjson.lines(rows))
+        output = options['output']
+        compress = options['gzip'] or (output or '').endswith('.gz')
+        if compress:
+            content = ndjson.gzipped(content)
+        if output:
+            with open(output, 'wb') as file:
+                file.writelines(content)
+            return
+        stream = getattr(self.stdout, 'buffer', None)
+        if stream is not None:
+            stream.writelines(content)
+            stream.flush()
+        elif compress:
+            raise CommandError('Сжатый вывод нельзя писать в текстовый поток')
+        else:
+            # куски заканчиваются на границе строк, utf-8 не разрывается
+            for chunk in content:
+                self.stdout.write(chunk.decode(), ending='')
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import comment_buffer
+
+
+class Command(BaseCommand):
+    help = 'Переносит комментарии из буфера отложенной записи в базу'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Сбрасывать каждые N секунд; 0 — один раз')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Комментариев в одной транзакции')
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                flushed = comment_buffer.flush(options['batch_size'])
+                if flushed or not options['interval']:
+                    self.stdout.write(f'Перенесено комментариев: {flushed}')
+                if not options['interval']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
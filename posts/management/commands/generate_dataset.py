@@ -0,0 +1,60 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.dataset import END, Generator
+from posts.ndjson import parse_moment
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу синтетическими пользователями, сообществами, '
+            'постами, комментариями и подписками')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument('--posts', type=int, default=100000)
+        parser.add_argument('--comments', type=int, default=200000)
+        parser.add_argument('--follows', type=int, default=20000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--alpha', type=float, default=1.1,
+                            help='Показатель степенного закона активности')
+        parser.add_argument('--days', type=int, default=365,
+                            help='За сколько дней распределить посты')
+        parser.add_argument('--end', default=None,
+                            help='Дата последнего поста, ISO 8601; по '
+                                 f'умолчанию {END.date().isoformat()}')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Строк в одной транзакции')
+        parser.add_argument('--prefix', default='user_',
+                            help='Префикс имён пользователей и сообществ')
+
+    def progress(self, name, done, total, elapsed):
+        step = self.batch_size * 20
+        if done == total or done % step < self.batch_size:
+            self.stdout.write(f'{name}: {done}/{total} '
+                              f'({done / max(elapsed, 1e-9):.0f} строк/с)')
+
+    def handle(self, *args, **options):
+        if options['users'] < 1:
+            raise CommandError('Нужен хотя бы один пользователь')
+        self.batch_size = options['batch_size']
+        try:
+            end = parse_moment(options['end'])
+        except ValueError as e:
+            raise CommandError(e)
+        generator = Generator(seed=options['seed'],
+                              alpha=options['alpha'],
+                              days=options['days'],
+                              batch_size=options['batch_size'],
+                              prefix=options['prefix'],
+                              progress=self.progress,
+                              end=end)
+        started = time.perf_counter()
+        try:
+            generator.generate(options['users'], options['groups'],
+                               options['posts'], options['comments'],
+                               options['follows'])
+        except ValueError as e:
+            raise CommandError(e)
+        self.stdout.write(f'Готово за {time.perf_counter() - started:.1f} с')
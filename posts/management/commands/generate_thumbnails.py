@@ -0,0 +1,105 @@
+import functools
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ('Создаёт все размеры миниатюр для картинок постов '
+            'в нескольких процессах')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Число процессов; 0 — в текущем процессе',
+        )
+        parser.add_argument(
+            '--chunk', type=int, default=200,
+            help='Картинок между сохранениями прогресса',
+        )
+        parser.add_argument(
+            '--state', default=None,
+            help='Файл прогресса: после прерывания команда продолжит '
+                 'с последнего сохранённого поста',
+        )
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Пересоздать миниатюры, даже если они уже есть',
+        )
+
+    def handle(self, *args, **options):
+        state = options['state']
+        last_pk = self.read_state(state)
+        workers = options['workers']
+        if settings.POSTS_TASKS_EAGER:
+            workers = 0
+        pool = None
+        if workers:
+            # spawn, а не fork: дочерние процессы не должны унаследовать
+            # открытые соединения с базой
+            pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=django.setup,
+            )
+        generate = functools.partial(thumbnails.generate,
+                                     force=options['force'])
+        started = time.perf_counter()
+        created = skipped = failed = 0
+        try:
+            for chunk in self.chunks(last_pk, options['chunk']):
+                todo = [name for _, name in chunk
+                        if options['force'] or not thumbnails.is_ready(name)]
+                skipped += len(chunk) - len(todo)
+                if pool is None:
+                    results = map(generate, todo)
+                else:
+                    results = pool.map(generate, todo)
+                for ok in results:
+                    created += ok
+                    failed += not ok
+                self.write_state(state, chunk[-1][0])
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f'Пост {chunk[-1][0]}: создано {created}, '
+                    f'пропущено {skipped}, ошибок {failed}, '
+                    f'{created / elapsed:.1f} картинок/с'
+                )
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        self.stdout.write(f'Готово: создано {created}, пропущено {skipped}, '
+                          f'ошибок {failed}')
+
+    def chunks(self, last_pk, size):
+        images = (Post.objects.exclude(image='')
+                  .exclude(image__isnull=True)
+                  .order_by('pk'))
+        while True:
+            chunk = list(images.filter(pk__gt=last_pk)
+                         .values_list('pk', 'image')[:size])
+            if not chunk:
+                return
+            yield chunk
+            last_pk = chunk[-1][0]
+
+    def read_state(self, path):
+        if not path or not os.path.exists(path):
+            return 0
+        with open(path) as state:
+            return int(state.read().strip() or 0)
+
+    def write_state(self, path, last_pk):
+        if not path:
+            return
+        with open(f'{path}.tmp', 'w') as state:
+            state.write(str(last_pk))
+        os.replace(f'{path}.tmp', path)
@@ -0,0 +1,56 @@
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import ndjson
+
+MAX_SHOWN_ERRORS = 20
+
+
+class Command(BaseCommand):
+    help = 'Загружает посты, комментарии или подписки из NDJSON-выгрузки'
+
+    def add_arguments(self, parser):
+        parser.add_argument('table', choices=sorted(ndjson.TABLES))
+        parser.add_argument('path', help='Файл NDJSON; .gz читается сжатым')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Строк в одной транзакции')
+        parser.add_argument('--create-missing', action='store_true',
+                            help='Создавать неизвестных пользователей')
+        parser.add_argument('--skip-existing', action='store_true',
+                            help='Пропускать строки, чьи id уже есть в базе: '
+                                 'так можно продолжить прерванную загрузку')
+
+    def handle(self, *args, **options):
+        importer = ndjson.Importer(options['table'],
+                                   create_missing=options['create_missing'],
+                                   skip_existing=options['skip_existing'])
+        lines = ndjson.read_lines(options['path'])
+        created = skipped = 0
+        errors = []
+        started = time.perf_counter()
+        try:
+            while True:
+                batch = list(islice(lines, options['batch_size']))
+                if not batch:
+                    break
+                count, existing, failed = importer.import_batch(batch)
+                created += count
+                skipped += existing
+                errors += failed
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f'Загружено {created} '
+                                  f'({created / elapsed:.0f} строк/с)')
+        except OSError as e:
+            raise CommandError(e)
+        importer.finish()
+
+        elapsed = time.perf_counter() - started
+        for number, message in errors[:MAX_SHOWN_ERRORS]:
+            self.stderr.write(f'Строка {number}: {message}')
+        self.stdout.write(f'Готово: загружено {created}, '
+                          f'отклонено {len(errors)}, '
+                          f'пропущено существующих {skipped} '
+                          f'за {elapsed:.1f} с '
+                          f'({created / max(elapsed, 1e-9):.0f} строк/с)')
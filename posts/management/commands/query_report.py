@@ -0,0 +1,34 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from yatube.metrics import FIELDS, summarize
+
+
+class Command(BaseCommand):
+    help = 'Перцентили стоимости представлений по журналу QUERY_METRICS_LOG'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--log', default=settings.QUERY_METRICS_LOG,
+                            help='Путь к NDJSON-журналу метрик')
+        parser.add_argument('--json', action='store_true',
+                            help='Вывести отчёт в JSON')
+
+    def handle(self, *args, **options):
+        if not options['log']:
+            raise CommandError('Не задан журнал: QUERY_METRICS_LOG или --log')
+        try:
+            with open(options['log']) as log:
+                report = summarize(json.loads(line) for line in log if line)
+        except FileNotFoundError:
+            raise CommandError(f'Журнал {options["log"]} не найден')
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        for view, stats in report.items():
+            self.stdout.write(f'{view} ({stats["requests"]} запросов)')
+            for field in FIELDS:
+                values = '  '.join(f'{name}={value:.4g}'
+                                   for name, value in stats[field].items())
+                self.stdout.write(f'    {field:14} {values}')
@@ -0,0 +1,30 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import timeline
+from posts.models import TimelineEntry
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает материализованные ленты подписок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'usernames',
+            nargs='*',
+            help='Пересобрать ленты только этих пользователей',
+        )
+
+    def handle(self, *args, **options):
+        if not timeline.enabled():
+            raise CommandError('Ленты выключены: POSTS_TIMELINE = False')
+        users = None
+        if options['usernames']:
+            users = User.objects.filter(username__in=options['usernames'])
+        timeline.rebuild(users)
+        entries = TimelineEntry.objects.all()
+        if users is not None:
+            entries = entries.filter(user__in=users)
+        self.stdout.write(f'Записей в лентах: {entries.count()}')
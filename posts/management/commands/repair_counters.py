@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from posts import counters
+from posts.models import Post
+from users.models import Profile
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счётчики постов и профилей'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только показать расхождения, ничего не исправлять',
+        )
+
+    def handle(self, *args, **options):
+        fix = not options['check']
+        if fix:
+            created = counters.create_missing_profiles()
+            self.stdout.write(f'Создано профилей: {created}')
+        posts = counters.repair(Post.objects.all(),
+                                counters.post_counters(), fix=fix)
+        profiles = counters.repair(Profile.objects.all(),
+                                   counters.profile_counters(), fix=fix)
+        verb = 'Исправлено' if fix else 'Расхождений'
+        self.stdout.write(f'{verb}: постов {posts}, профилей {profiles}')
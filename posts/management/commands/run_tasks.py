@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import tasks
+
+
+class Command(BaseCommand):
+    help = ('Выполняет фоновые задачи из таблицы: повторы, задачи упавших '
+            'процессов и всё, что поставлено при POSTS_TASK_WORKERS = 0')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Проверять очередь каждые N секунд; '
+                                 '0 — один проход')
+        parser.add_argument('--workers', type=int, default=2,
+                            help='Потоков; 0 — в текущем потоке')
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help='Задач за один проход')
+        parser.add_argument('--purge-days', type=float, default=7,
+                            help='Удалять выполненные задачи старше N дней')
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                done = tasks.run_due(options['batch_size'],
+                                     options['workers'])
+                if done or not options['interval']:
+                    self.stdout.write(f'Выполнено задач: {done}')
+                if not options['interval']:
+                    break
+                if done < options['batch_size']:
+                    tasks.purge(options['purge_days'])
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        else:
+            tasks.purge(options['purge_days'])
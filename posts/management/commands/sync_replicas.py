@@ -0,0 +1,38 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from posts.models import ReplicaSync
+
+
+class Command(BaseCommand):
+    help = ('Копирует основную базу SQLite в файлы реплик из '
+            'DATABASE_REPLICAS (для проверки чтения с реплик локально)')
+
+    def handle(self, *args, **options):
+        primary = connections['default']
+        if primary.vendor != 'sqlite':
+            raise CommandError('Реплики копируются только для SQLite; '
+                               'для других СУБД настройте репликацию')
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError('Реплики не настроены: задайте YATUBE_REPLICAS')
+        source = sqlite3.connect(primary.settings_dict['NAME'])
+        try:
+            for alias in settings.DATABASE_REPLICAS:
+                name = connections[alias].settings_dict['NAME']
+                # всё, что записано до этого момента, попадёт в копию, а
+                # с ним и сам момент (yatube/replicas.py)
+                with source:
+                    source.execute(
+                        f'REPLACE INTO {ReplicaSync._meta.db_table} '
+                        f'(id, synced) VALUES (1, ?)', [time.time()])
+                # backup() копирует согласованный снимок, не мешая записи
+                with sqlite3.connect(name) as target:
+                    source.backup(target)
+                target.close()
+                self.stdout.write(f'{alias}: {name}')
+        finally:
+            source.close()
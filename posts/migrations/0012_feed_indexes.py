@@ -0,0 +1,55 @@
+# Generated by Django 2.2.6 on 2026-10-18 04:47
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def remove_duplicate_follows(apps, schema_editor):
+    Follow = apps.get_model('posts', 'Follow')
+    Profile = apps.get_model('users', 'Profile')
+    duplicates = (Follow.objects.values('user', 'author')
+                  .annotate(first=Min('id'), total=Count('id'))
+                  .filter(total__gt=1))
+    for row in duplicates:
+        (Follow.objects.filter(user=row['user'], author=row['author'])
+         .exclude(id=row['first'])
+         .delete())
+        Profile.objects.filter(user_id=row['user']).update(
+            following_count=Follow.objects.filter(
+                user_id=row['user']).count())
+        Profile.objects.filter(user_id=row['author']).update(
+            followers_count=Follow.objects.filter(
+                author_id=row['author']).count())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_timelineentry'),
+        ('users', '0002_fill_profiles'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'created', 'id'], name='comment_post_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-pub_date', '-id'], name='post_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', '-pub_date', '-id'], name='post_author_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['group', '-pub_date', '-id'], name='post_group_pub_date_idx'),
+        ),
+        migrations.RunPython(remove_duplicate_follows,
+                             migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='unique_follow'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 2.2.6 on 2026-10-18 15:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_timeline_pub_date'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReplicaSync',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('synced', models.FloatField()),
+            ],
+        ),
+    ]
@@ -1,6 +1,7 @@
 from typing import Text
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 
 User = get_user_model()
 
@@ -14,6 +15,11 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        return self.select_related('author', 'group')
+
+
 class Post(models.Model):
     text = models.TextField()
     pub_date = models.DateTimeField("date published", auto_now_add=True)
@@ -26,12 +32,23 @@ class Post(models.Model):
                               null=True, 
                               related_name="group_posts")
     image = models.ImageField(upload_to='posts/', blank=True, null=True)
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+    updated = models.DateTimeField(auto_now=True)
+
+    objects = PostQuerySet.as_manager()
 
     def __str__(self):
         return self.text
     
     class Meta:
         ordering = ("-pub_date",)
+        indexes = [
+            models.Index(fields=["-pub_date", "-id"], name="post_pub_date_idx"),
+            models.Index(fields=["author", "-pub_date", "-id"],
+                         name="post_author_pub_date_idx"),
+            models.Index(fields=["group", "-pub_date", "-id"],
+                         name="post_group_pub_date_idx"),
+        ]
 
 
 class Comment(models.Model):
@@ -45,6 +62,15 @@ class Comment(models.Model):
                                related_name="comment")
     text = models.TextField()
     created = models.DateTimeField("date published", auto_now_add=True)
+    # id записи из буфера комментариев: повторный сброс её не задвоит
+    buffer_key = models.CharField(max_length=32, unique=True, null=True,
+                                  blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["post", "created", "id"],
+                         name="comment_post_created_idx"),
+        ]
 
 
 class Follow(models.Model):
@@ -54,3 +80,70 @@ class Follow(models.Model):
     author = models.ForeignKey(User, 
                                on_delete=models.CASCADE,
                                related_name="following")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "author"],
+                                    name="unique_follow"),
+        ]
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(User,
+                             on_delete=models.CASCADE,
+                             related_name="timeline")
+    post = models.ForeignKey(Post,
+                             on_delete=models.CASCADE,
+                             related_name="timeline_entries")
+    # копия post.pub_date: страница ленты читается по индексу без
+    # соединения с постами
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        unique_together = ("user", "post")
+        indexes = [
+            models.Index(fields=["user", "-pub_date", "-post"],
+                         name="timeline_feed_idx"),
+        ]
+
+
+class Task(models.Model):
+    """Фоновая задача (posts/tasks.py)."""
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUSES = [
+        (PENDING, "ждёт"),
+        (RUNNING, "выполняется"),
+        (DONE, "выполнена"),
+        (FAILED, "не удалась"),
+    ]
+
+    name = models.CharField(max_length=200)
+    args = models.TextField(default="[]")
+    # ключ идемпотентности: задача с тем же ключом не ставится повторно
+    key = models.CharField(max_length=200, unique=True, null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUSES,
+                              default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    run_at = models.DateTimeField(default=timezone.now)
+    # до какого момента задача закреплена за исполнителем
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "run_at"], name="task_due_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.status})"
+
+
+class ReplicaSync(models.Model):
+    """Одна строка: момент (time.time()), до которого в базе есть все
+    изменения. Пишется в основную базу перед копированием, так что каждая
+    реплика знает, насколько она свежая (yatube/replicas.py)."""
+    synced = models.FloatField()
@@ -0,0 +1,404 @@
+import datetime as dt
+import gzip
+import json
+import zlib
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, connections, router, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from users.models import Profile
+from . import counters, feed_cache, search, timeline
+from .forms import CommentForm, PostForm
+from .models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+CHUNK_SIZE = 2000
+
+# Авторы и сообщества выгружаются по username и slug, а не по id,
+# чтобы выгрузку можно было загрузить в другую базу.
+TABLES = {
+    'posts': (Post, {
+        'id': 'id',
+        'text': 'text',
+        'pub_date': 'pub_date',
+        'author': 'author__username',
+        'group': 'group__slug',
+        'image': 'image',
+    }),
+    'comments': (Comment, {
+        'id': 'id',
+        'post': 'post_id',
+        'author': 'author__username',
+        'text': 'text',
+        'created': 'created',
+    }),
+    'follows': (Follow, {
+        'id': 'id',
+        'user': 'user__username',
+        'author': 'author__username',
+    }),
+}
+
+FILTERS = {
+    'posts': {'author': 'author__username', 'group': 'group__slug',
+              'date': 'pub_date'},
+    'comments': {'author': 'author__username', 'group': 'post__group__slug',
+                 'date': 'created'},
+    'follows': {'author': 'author__username'},
+}
+
+
+def parse_moment(value, end=False):
+    if not value:
+        return None
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f'Некорректная дата: {value}')
+        moment = dt.datetime.combine(day, dt.time.max if end else dt.time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment, timezone.utc)
+    return moment
+
+
+def rows(table, author=None, group=None, since=None, until=None,
+         chunk_size=CHUNK_SIZE):
+    if table not in TABLES:
+        raise ValueError(f'Неизвестная таблица: {table}')
+    model, columns = TABLES[table]
+    filters = FILTERS[table]
+    queryset = model.objects.order_by('pk')
+    conditions = {}
+    if author:
+        conditions[filters['author']] = author
+    if group:
+        if 'group' not in filters:
+            raise ValueError(f'Таблицу {table} нельзя фильтровать по группе')
+        conditions[filters['group']] = group
+    for value, lookup, end in ((since, 'gte', False), (until, 'lte', True)):
+        moment = parse_moment(value, end=end)
+        if moment is None:
+            continue
+        if 'date' not in filters:
+            raise ValueError(f'Таблицу {table} нельзя фильтровать по дате')
+        conditions[f'{filters["date"]}__{lookup}'] = moment
+    values = queryset.filter(**conditions).values_list(*columns.values())
+    return (dict(zip(columns, row))
+            for row in values.iterator(chunk_size=chunk_size))
+
+
+def _default(value):
+    if isinstance(value, dt.datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def lines(rows):
+    for row in rows:
+        yield (json.dumps(row, ensure_ascii=False, default=_default)
+               + '\n').encode()
+
+
+def buffered(chunks, size=64 * 1024):
+    buffer = []
+    length = 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            yield b''.join(buffer)
+            buffer = []
+            length = 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def gzipped(chunks, level=6):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+class RowError(ValueError):
+    pass
+
+
+def read_lines(path):
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as file:
+        for number, line in enumerate(file, 1):
+            if line.strip():
+                yield number, line
+
+
+class Lookup:
+    """Кэш соответствий username/slug -> id. Неизвестные ключи
+    догружаются пачкой одним запросом на весь батч."""
+
+    QUERY_CHUNK = 500
+
+    def __init__(self, queryset, field):
+        self.queryset = queryset
+        self.field = field
+        self.cache = {}
+
+    def prefetch(self, keys):
+        missing = list({key for key in keys
+                        if key is not None and key not in self.cache})
+        for start in range(0, len(missing), self.QUERY_CHUNK):
+            chunk = missing[start:start + self.QUERY_CHUNK]
+            found = dict(self.queryset
+                         .filter(**{f'{self.field}__in': chunk})
+                         .values_list(self.field, 'pk'))
+            for key in chunk:
+                self.cache[key] = found.get(key)
+
+    def get(self, key, required=True):
+        if key is None and not required:
+            return None
+        pk = self.cache.get(key)
+        if pk is None:
+            raise RowError(f'Не найден объект {self.field}={key!r}')
+        return pk
+
+
+def bulk_insert(model, objects, ignore_conflicts=False):
+    """Вставляет объекты через executemany, как dataset.Generator._insert,
+    и сохраняет даты из объектов: bulk_create перезаписал бы поля
+    auto_now_add текущим временем. Пустые даты и поля auto_now получают
+    текущее время. Сигналы не отправляются."""
+    now = timezone.now()
+    meta = model._meta
+    connection = connections[router.db_for_write(model)]
+    ops = connection.ops
+    for obj in objects:
+        for field in meta.concrete_fields:
+            if (getattr(field, 'auto_now', False)
+                    or (getattr(field, 'auto_now_add', False)
+                        and getattr(obj, field.attname) is None)):
+                setattr(obj, field.attname, now)
+    for with_pk in (True, False):
+        objs = [obj for obj in objects if (obj.pk is not None) is with_pk]
+        if not objs:
+            continue
+        fields = [field for field in meta.concrete_fields
+                  if with_pk or field is not meta.auto_field]
+        columns = ', '.join(ops.quote_name(field.column) for field in fields)
+        sql = (f'{ops.insert_statement(ignore_conflicts=ignore_conflicts)} '
+               f'{ops.quote_name(meta.db_table)} ({columns}) '
+               f'VALUES ({", ".join(["%s"] * len(fields))}) '
+               f'{ops.ignore_conflicts_suffix_sql(ignore_conflicts)}')
+        rows = [[field.get_db_prep_save(getattr(obj, field.attname),
+                                        connection)
+                 for field in fields] for obj in objs]
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, rows)
+
+
+def _clean(form_class, name, value):
+    try:
+        return form_class.base_fields[name].clean(value)
+    except ValidationError as e:
+        raise RowError(f'{name}: {"; ".join(e.messages)}')
+
+
+def _moment(value):
+    try:
+        return parse_moment(value) or timezone.now()
+    except ValueError as e:
+        raise RowError(str(e))
+
+
+class Importer:
+    def __init__(self, table, create_missing=False, skip_existing=False):
+        if table not in TABLES:
+            raise ValueError(f'Неизвестная таблица: {table}')
+        self.table = table
+        self.model = TABLES[table][0]
+        self.create_missing = create_missing
+        # подписки всегда идемпотентны: повторная просто пропускается
+        self.skip_existing = skip_existing or table == 'follows'
+        self.users = Lookup(User.objects.all(), 'username')
+        self.groups = Lookup(Group.objects.all(), 'slug')
+        self.posts = Lookup(Post.objects.all(), 'pk')
+        self.author_ids = set()
+        self.group_ids = set()
+        self.post_ids = set()
+        self.user_ids = set()
+        self.created_user_ids = set()
+        # посты без id в файле получат id больше этого
+        self.last_post_pk = Post.objects.aggregate(
+            last=Max('pk'))['last'] or 0
+        self.new_post_ids = set()
+
+    def prepare(self, rows):
+        usernames = set()
+        for row in rows:
+            usernames.update(row.get(key) for key in ('author', 'user'))
+        self.users.prefetch(usernames)
+        if self.create_missing:
+            missing = [name for name in usernames
+                       if name and self.users.cache.get(name) is None]
+            User.objects.bulk_create(User(username=name) for name in missing)
+            for name in missing:
+                del self.users.cache[name]
+            self.users.prefetch(missing)
+            self.created_user_ids.update(self.users.cache[name]
+                                         for name in missing)
+        self.groups.prefetch(row.get('group') for row in rows)
+        self.posts.prefetch(row.get('post') for row in rows)
+
+    def build(self, row):
+        if self.table == 'posts':
+            post = Post(id=row.get('id'),
+                        text=_clean(PostForm, 'text', row.get('text')),
+                        author_id=self.users.get(row.get('author')),
+                        group_id=self.groups.get(row.get('group'),
+                                                 required=False),
+                        image=row.get('image') or None,
+                        pub_date=_moment(row.get('pub_date')))
+            self.author_ids.add(post.author_id)
+            self.group_ids.add(post.group_id)
+            if post.pk is not None:
+                self.new_post_ids.add(post.pk)
+            return post
+        if self.table == 'comments':
+            comment = Comment(id=row.get('id'),
+                              post_id=self.posts.get(row.get('post')),
+                              author_id=self.users.get(row.get('author')),
+                              text=_clean(CommentForm, 'text',
+                                          row.get('text')),
+                              created=_moment(row.get('created')))
+            self.post_ids.add(comment.post_id)
+            return comment
+        follow = Follow(id=row.get('id'),
+                        user_id=self.users.get(row.get('user')),
+                        author_id=self.users.get(row.get('author')))
+        if follow.user_id == follow.author_id:
+            raise RowError('Нельзя подписаться на самого себя')
+        self.author_ids.add(follow.author_id)
+        self.user_ids.add(follow.user_id)
+        return follow
+
+    def _existing(self, objects):
+        """Номера строк, чьи объекты уже есть в базе или раньше в батче."""
+        if self.table == 'follows':
+            identity = lambda obj: (obj.user_id, obj.author_id)  # noqa: E731
+            stored = set(Follow.objects.filter(
+                user_id__in={obj.user_id for _, obj in objects},
+                author_id__in={obj.author_id for _, obj in objects},
+            ).values_list('user_id', 'author_id'))
+        else:
+            identity = lambda obj: obj.pk  # noqa: E731
+            stored = set(self.model.objects.filter(
+                pk__in={obj.pk for _, obj in objects if obj.pk is not None}
+            ).values_list('pk', flat=True))
+        existing = set()
+        for number, obj in objects:
+            key = identity(obj)
+            if key is None:
+                continue
+            if key in stored:
+                existing.add(number)
+            stored.add(key)
+        return existing
+
+    def import_batch(self, batch):
+        """batch — список пар (номер строки, строка). Возвращает число
+        вставленных объектов, число пропущенных (уже были в базе, при
+        skip_existing) и список ошибок (номер строки, текст)."""
+        rows = []
+        errors = []
+        for number, line in batch:
+            try:
+                row = json.loads(line)
+                if not isinstance(row, dict):
+                    raise ValueError('ожидался объект JSON')
+                rows.append((number, row))
+            except ValueError as e:
+                errors.append((number, f'Некорректный JSON: {e}'))
+        self.prepare([row for _, row in rows])
+        objects = []
+        for number, row in rows:
+            try:
+                objects.append((number, self.build(row)))
+            except RowError as e:
+                errors.append((number, str(e)))
+        skipped = 0
+        if self.skip_existing and objects:
+            existing = self._existing(objects)
+            skipped = len(existing)
+            objects = [(number, obj) for number, obj in objects
+                       if number not in existing]
+        try:
+            with transaction.atomic():
+                bulk_insert(self.model, [obj for _, obj in objects],
+                            ignore_conflicts=self.skip_existing)
+        except IntegrityError as e:
+            # чаще всего строки уже загружены прошлым запуском
+            message = f'Батч не загружен: {e}; повторите с --skip-existing'
+            return 0, skipped, errors + [(number, message)
+                                         for number, _ in objects]
+        return len(objects), skipped, errors
+
+    @staticmethod
+    def _chunks(queryset, field, ids):
+        ids = list(ids)
+        for start in range(0, len(ids), Lookup.QUERY_CHUNK):
+            chunk = ids[start:start + Lookup.QUERY_CHUNK]
+            yield queryset.filter(**{f'{field}__in': chunk})
+
+    def new_posts(self):
+        """Загруженные посты пачками: созданные после начала загрузки и
+        те, чей id был в файле."""
+        yield Post.objects.filter(pk__gt=self.last_post_pk)
+        yield from self._chunks(Post.objects.filter(
+            pk__lte=self.last_post_pk), 'pk', self.new_post_ids)
+
+    def finish(self):
+        """bulk_insert не шлёт сигналов: счётчики, поиск, кэш лент и
+        материализованные ленты приводятся в порядок здесь, но только для
+        строк, которых коснулась загрузка."""
+        for users in self._chunks(User.objects.all(), 'pk',
+                                  self.created_user_ids):
+            counters.create_missing_profiles(users)
+        for profiles in self._chunks(Profile.objects.all(), 'user_id',
+                                     self.author_ids | self.user_ids):
+            counters.repair(profiles, counters.profile_counters())
+        for posts in self._chunks(Post.objects.all(), 'pk', self.post_ids):
+            counters.repair(posts, counters.post_counters())
+        if self.table == 'posts':
+            for posts in self.new_posts():
+                counters.repair(posts, counters.post_counters())
+                search.backend().index_many(posts)
+
+        scopes = set()
+        post_ids = list(self.post_ids)
+        for start in range(0, len(post_ids), Lookup.QUERY_CHUNK):
+            posts = Post.objects.filter(
+                pk__in=post_ids[start:start + Lookup.QUERY_CHUNK])
+            for author_id, group_id in posts.values_list('author_id',
+                                                         'group_id'):
+                scopes.update(feed_cache.post_scopes(author_id, group_id))
+        for author_id in self.author_ids:
+            scopes.update(feed_cache.post_scopes(author_id, *self.group_ids))
+        scopes.update(feed_cache.profile_scope(pk) for pk in self.user_ids)
+        feed_cache.bump(*scopes)
+
+        if not timeline.enabled():
+            return
+        if self.table == 'posts':
+            followers = Follow.objects.filter(
+                author_id__in=self.author_ids).values('user_id')
+            timeline.rebuild(User.objects.filter(pk__in=followers))
+        elif self.table == 'follows':
+            timeline.rebuild(User.objects.filter(pk__in=self.user_ids))
@@ -0,0 +1,167 @@
+import base64
+import binascii
+import hashlib
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+
+class InvalidCursor(InvalidPage):
+    pass
+
+
+class CursorPage:
+    is_cursor = True
+
+    def __init__(self, object_list, paginator, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return '<CursorPage of %s items>' % len(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """Keyset-пагинация: страница выбирается условием по ключу сортировки,
+    а не OFFSET, поэтому любая страница стоит столько же, сколько первая.
+    Ключ сортировки — поля модели или аннотации queryset.
+    """
+
+    def __init__(self, object_list, per_page,
+                 ordering=('-pub_date', '-id'), with_count=True):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+        self.with_count = with_count
+        self.fields = [
+            (name.lstrip('-'), name.startswith('-')) for name in self.ordering
+        ]
+
+    @cached_property
+    def count(self):
+        if not self.with_count:
+            return None
+        return self.object_list.count()
+
+    def encode_cursor(self, obj, reverse=False):
+        values = [self._value(obj, name) for name, _ in self.fields]
+        raw = json.dumps([int(reverse), values], separators=(',', ':'))
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            reverse, values = json.loads(base64.urlsafe_b64decode(padded))
+            if len(values) != len(self.fields):
+                raise ValueError
+            values = [
+                self._field(name).to_python(value)
+                for (name, _), value in zip(self.fields, values)
+            ]
+        except (TypeError, ValueError, binascii.Error, ValidationError) as e:
+            raise InvalidCursor('Некорректный курсор') from e
+        return bool(reverse), values
+
+    def cursor_key(self, cursor):
+        """Курсор в каноническом виде для ключа кэша; None для первой
+        страницы и вместо некорректного курсора, как в get_page."""
+        if not cursor:
+            return None
+        try:
+            reverse, values = self.decode_cursor(cursor)
+        except InvalidCursor:
+            return None
+        raw = json.dumps([int(reverse), [str(value) for value in values]],
+                         separators=(',', ':'))
+        return hashlib.md5(raw.encode()).hexdigest()
+
+    def first_page(self, items):
+        """Первая страница из уже выбранных (например, из кэша) первых
+        per_page + 1 объектов."""
+        items = list(items)
+        return self._build_page(items[:self.per_page],
+                                has_next=len(items) > self.per_page,
+                                has_previous=False)
+
+    def page(self, cursor=None):
+        if not cursor:
+            return self.first_page(
+                self.object_list.order_by(*self.ordering)[:self.per_page + 1]
+            )
+
+        reverse, values = self.decode_cursor(cursor)
+        queryset = self.object_list.filter(self._after(values, reverse))
+        if reverse:
+            ordering = [self._flip(name) for name in self.ordering]
+            items = list(queryset.order_by(*ordering)[:self.per_page + 1])
+            has_more = len(items) > self.per_page
+            items = items[:self.per_page][::-1]
+            return self._build_page(items, has_next=True,
+                                    has_previous=has_more)
+        items = list(queryset.order_by(*self.ordering)[:self.per_page + 1])
+        has_more = len(items) > self.per_page
+        items = items[:self.per_page]
+        return self._build_page(items, has_next=has_more, has_previous=True)
+
+    def get_page(self, cursor=None):
+        try:
+            return self.page(cursor)
+        except InvalidCursor:
+            return self.page(None)
+
+    def _build_page(self, items, has_next, has_previous):
+        next_cursor = previous_cursor = None
+        if items and has_next:
+            next_cursor = self.encode_cursor(items[-1])
+        if items and has_previous:
+            previous_cursor = self.encode_cursor(items[0], reverse=True)
+        return CursorPage(items, self, next_cursor, previous_cursor)
+
+    def _after(self, values, reverse):
+        condition = Q()
+        equal = Q()
+        for (name, descending), value in zip(self.fields, values):
+            lookup = 'lt' if descending != reverse else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def _field(self, name):
+        annotation = self.object_list.query.annotations.get(name)
+        if annotation is not None:
+            return annotation.output_field
+        return self.object_list.model._meta.get_field(name)
+
+    def _value(self, obj, name):
+        if name in self.object_list.query.annotations:
+            value = getattr(obj, name)
+            return value.isoformat() if hasattr(value, 'isoformat') \
+                else str(value)
+        return self._field(name).value_to_string(obj)
+
+    @staticmethod
+    def _flip(name):
+        return name[1:] if name.startswith('-') else '-' + name
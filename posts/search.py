@@ -0,0 +1,186 @@
+"""Полнотекстовый поиск по постам.
+
+Бэкенд задаётся настройкой POSTS_SEARCH_BACKEND. Fts5Backend хранит
+инвертированный индекс в виртуальной таблице SQLite FTS5 (её создаёт
+миграция 0013), LikeBackend ищет подстроки в posts_post и годится для
+других СУБД и для сравнения.
+"""
+import re
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection
+from django.utils.html import escape
+from django.utils.module_loading import import_string
+from django.utils.safestring import mark_safe
+
+from .models import Post
+
+TABLE = 'posts_post_fts'
+MAX_TERMS = 8
+SNIPPET_TOKENS = 16
+SNIPPET_CHARS = 160
+BATCH_SIZE = 1000
+
+# Маркеры подсветки не встречаются в тексте и переживают escape().
+_START, _END = '\x02', '\x03'
+
+
+def backend():
+    return import_string(settings.POSTS_SEARCH_BACKEND)()
+
+
+def terms(query):
+    return re.findall(r'\w+', query.lower())[:MAX_TERMS]
+
+
+def highlight(snippet):
+    return mark_safe(escape(snippet).replace(_START, '<mark>')
+                     .replace(_END, '</mark>'))
+
+
+class Results:
+    """Ленивая последовательность для Paginator: count() и каждый срез
+    обходятся одним запросом к индексу и одним запросом за постами."""
+
+    def __init__(self, backend, terms):
+        self.backend = backend
+        self.terms = terms
+        self._count = None
+
+    def count(self):
+        if self._count is None:
+            self._count = self.backend.count(self.terms) if self.terms else 0
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+        offset = key.start or 0
+        limit = (key.stop if key.stop is not None else self.count()) - offset
+        if not self.terms or limit <= 0:
+            return []
+        hits = self.backend.hits(self.terms, offset, limit)
+        posts = Post.objects.for_feed().in_bulk([pk for pk, _ in hits])
+        found = []
+        for pk, snippet in hits:
+            if pk in posts:
+                posts[pk].snippet = highlight(snippet)
+                found.append(posts[pk])
+        return found
+
+
+class BaseBackend:
+    def index(self, post):
+        pass
+
+    def remove(self, post_id):
+        pass
+
+    def index_many(self, posts):
+        """Индексирует посты из queryset posts."""
+        for post in posts.iterator():
+            self.index(post)
+
+    def rebuild(self):
+        return 0
+
+    def count(self, terms):
+        raise NotImplementedError
+
+    def hits(self, terms, offset, limit):
+        """Список пар (id поста, фрагмент с маркерами подсветки)
+        в порядке релевантности."""
+        raise NotImplementedError
+
+    def search(self, query):
+        return Results(self, terms(query))
+
+
+def mark_terms(text, terms, width=SNIPPET_CHARS):
+    pattern = re.compile('|'.join(re.escape(term) for term in terms),
+                         re.IGNORECASE)
+    match = pattern.search(text)
+    start = max(0, (match.start() if match else 0) - width // 4)
+    snippet = text[start:start + width]
+    snippet = pattern.sub(lambda m: _START + m.group() + _END, snippet)
+    prefix = '…' if start else ''
+    suffix = '…' if start + width < len(text) else ''
+    return prefix + snippet + suffix
+
+
+class LikeBackend(BaseBackend):
+    """LIKE '%слово%' по каждому слову: полный просмотр таблицы постов."""
+
+    def _queryset(self, terms):
+        posts = Post.objects.all()
+        for term in terms:
+            posts = posts.filter(text__icontains=term)
+        return posts.order_by('-pub_date', '-id')
+
+    def count(self, terms):
+        return self._queryset(terms).count()
+
+    def hits(self, terms, offset, limit):
+        rows = self._queryset(terms).values_list('pk', 'text')
+        return [(pk, mark_terms(text, terms))
+                for pk, text in rows[offset:offset + limit]]
+
+
+class Fts5Backend(BaseBackend):
+    """Индекс FTS5, ранжирование по bm25. Каждое слово запроса ищется
+    как префикс, поэтому «котик» находит и «котики»."""
+
+    def _match(self, terms):
+        # terms состоят только из \w, кавычки внутри фразы не нужны
+        return ' '.join(f'"{term}"*' for term in terms)
+
+    def index(self, post):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [post.pk])
+            cursor.execute(f'INSERT INTO {TABLE}(rowid, text) VALUES (%s, %s)',
+                           [post.pk, post.text])
+
+    def remove(self, post_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [post_id])
+
+    def index_many(self, posts):
+        rows = posts.values_list('pk', 'text').iterator()
+        while True:
+            batch = list(islice(rows, BATCH_SIZE))
+            if not batch:
+                return
+            with connection.cursor() as cursor:
+                cursor.executemany(f'DELETE FROM {TABLE} WHERE rowid = %s',
+                                   [(pk,) for pk, _ in batch])
+                cursor.executemany(
+                    f'INSERT INTO {TABLE}(rowid, text) VALUES (%s, %s)',
+                    batch)
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {TABLE}')
+            cursor.execute(f'INSERT INTO {TABLE}(rowid, text) '
+                           f'SELECT id, text FROM {Post._meta.db_table}')
+            return cursor.rowcount
+
+    def count(self, terms):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT count(*) FROM {TABLE} '
+                           f'WHERE {TABLE} MATCH %s', [self._match(terms)])
+            return cursor.fetchone()[0]
+
+    def hits(self, terms, offset, limit):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid, snippet({TABLE}, 0, %s, %s, %s, %s) '
+                f'FROM {TABLE} WHERE {TABLE} MATCH %s '
+                f'ORDER BY rank, rowid DESC LIMIT %s OFFSET %s',
+                [_START, _END, '…', SNIPPET_TOKENS, self._match(terms),
+                 limit, offset],
+            )
+            return cursor.fetchall()
@@ -0,0 +1,121 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import comment_cache, counters, feed_cache, search, timeline
+from .models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+def invalidate_post_feeds(post_id):
+    post = Post.objects.filter(pk=post_id).values('author_id', 'group_id')
+    for values in post:
+        feed_cache.bump(*feed_cache.post_scopes(values['author_id'],
+                                                values['group_id']))
+
+
+def invalidate_profiles(follow):
+    # счётчики подписок и кнопка подписки меняют страницы обоих профилей
+    feed_cache.bump(feed_cache.profile_scope(follow.user_id),
+                    feed_cache.profile_scope(follow.author_id))
+
+
+def invalidate_cards_of(posts, *scopes):
+    # карточки с новым именем получат новые ключи (cards.card_key), но
+    # страницы лент, в которые они вставлены, нужно перерисовать
+    authors = posts.values_list('author_id', flat=True).distinct()
+    groups = posts.exclude(group=None).values_list('group_id',
+                                                   flat=True).distinct()
+    feed_cache.bump(feed_cache.index_scope(), *scopes,
+                    *map(feed_cache.profile_scope, authors),
+                    *map(feed_cache.group_scope, groups))
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        # заголовок и описание страницы сообщества входят в её ETag, а
+        # название — в карточки его постов во всех лентах
+        invalidate_cards_of(Post.objects.filter(group=instance),
+                            feed_cache.group_scope(instance.pk))
+
+
+@receiver(pre_save, sender=User)
+def user_saving(sender, instance, raw=False, update_fields=None, **kwargs):
+    if instance.pk and not raw and (update_fields is None
+                                    or 'username' in update_fields):
+        instance._previous_username = User.objects.filter(
+            pk=instance.pk).values_list('username', flat=True).first()
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, raw=False, **kwargs):
+    previous = getattr(instance, '_previous_username', None)
+    if previous is not None and previous != instance.username:
+        invalidate_cards_of(Post.objects.filter(author=instance),
+                            feed_cache.profile_scope(instance.pk))
+
+
+@receiver(pre_save, sender=Post)
+def post_saving(sender, instance, raw=False, **kwargs):
+    if instance.pk and not raw:
+        instance._previous_group_id = Post.objects.filter(
+            pk=instance.pk).values_list('group_id', flat=True).first()
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        counters.post_changed(instance, 1)
+        timeline.schedule_fan_out(instance)
+    search.backend().index(instance)
+    previous_group_id = getattr(instance, '_previous_group_id', None)
+    feed_cache.bump(*feed_cache.post_scopes(instance.author_id,
+                                            instance.group_id,
+                                            previous_group_id))
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.post_changed(instance, -1)
+    search.backend().remove(instance.pk)
+    feed_cache.bump(*feed_cache.post_scopes(instance.author_id,
+                                            instance.group_id))
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        counters.comment_changed(instance, 1)
+        comment_cache.append(instance)
+    else:
+        comment_cache.invalidate(instance.post_id)
+    invalidate_post_feeds(instance.post_id)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.comment_changed(instance, -1)
+    comment_cache.invalidate(instance.post_id)
+    invalidate_post_feeds(instance.post_id)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.follow_changed(instance, 1)
+        timeline.backfill(instance.user_id, instance.author_id)
+        invalidate_profiles(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.follow_changed(instance, -1)
+    timeline.remove(instance.user_id, instance.author_id)
+    timeline.follower_lost(instance.author_id)
+    invalidate_profiles(instance)
@@ -0,0 +1,160 @@
+"""Фоновые задачи без брокера.
+
+enqueue(func, *args) записывает задачу в таблицу posts_task в той же
+транзакции, что и данные, ради которых она ставится, а после коммита
+отдаёт её пулу потоков этого процесса (POSTS_TASK_WORKERS). Если процесс
+упадёт раньше, задачу подберёт manage.py run_tasks: он же выполняет
+повторы по расписанию и задачи, у которых истекла аренда исполнителя.
+
+Задача — функция уровня модуля, её имя и аргументы (JSON) хранятся в
+строке таблицы. Упавшая задача повторяется с экспоненциальной паузой,
+пока не кончатся попытки (декоратор task). С ключом key задача ставится
+один раз: повторный enqueue с тем же ключом ничего не делает, пока
+задача не провалилась окончательно, — тогда он ставит её заново.
+
+С POSTS_TASKS_EAGER задача выполняется прямо в enqueue, в транзакции
+вызывающего: так её видят тесты на in-memory SQLite, недоступной другим
+соединениям.
+"""
+import json
+import logging
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_lock = threading.Lock()
+
+
+def task(max_attempts=None, retry_delay=None):
+    """Задаёт число попыток и паузу перед первым повтором в секундах;
+    по умолчанию — POSTS_TASK_MAX_ATTEMPTS и POSTS_TASK_RETRY_DELAY."""
+    def decorator(func):
+        func.max_attempts = max_attempts
+        func.retry_delay = retry_delay
+        return func
+    return decorator
+
+
+def executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.POSTS_TASK_WORKERS,
+                thread_name_prefix='tasks',
+            )
+        return _executor
+
+
+def enqueue(func, *args, key=None):
+    name = f'{func.__module__}.{func.__qualname__}'
+    values = {'name': name, 'args': json.dumps(args)}
+    if key is None:
+        queued = Task.objects.create(**values)
+    else:
+        queued, created = Task.objects.get_or_create(key=key, defaults=values)
+        if not created and not _restart(queued, values):
+            return queued
+    if settings.POSTS_TASKS_EAGER:
+        run(queued.pk)
+    elif settings.POSTS_TASK_WORKERS:
+        transaction.on_commit(lambda: executor().submit(_run_in_thread,
+                                                        queued.pk))
+    return queued
+
+
+def _restart(queued, values):
+    restarted = Task.objects.filter(pk=queued.pk, status=Task.FAILED).update(
+        status=Task.PENDING, attempts=0, run_at=timezone.now(),
+        last_error='', **values)
+    return bool(restarted)
+
+
+def _run_in_thread(task_id):
+    try:
+        return run(task_id)
+    finally:
+        close_old_connections()
+
+
+def due(now=None):
+    now = now or timezone.now()
+    return Task.objects.filter(
+        Q(status=Task.PENDING, run_at__lte=now)
+        | Q(status=Task.RUNNING, locked_until__lt=now)
+    )
+
+
+def run(task_id):
+    """Выполняет задачу, если она ещё ничья. Возвращает True или False
+    по результату и None, если задачу уже взял другой исполнитель."""
+    now = timezone.now()
+    lease = timedelta(seconds=settings.POSTS_TASK_LEASE)
+    claimed = due(now).filter(pk=task_id).update(
+        status=Task.RUNNING, attempts=F('attempts') + 1,
+        locked_until=now + lease,
+    )
+    if not claimed:
+        return None
+    queued = Task.objects.get(pk=task_id)
+    func = None
+    try:
+        func = import_string(queued.name)
+        func(*json.loads(queued.args))
+    except Exception:
+        logger.exception('Задача %s #%s упала', queued.name, task_id)
+        _retry_or_fail(queued, func, traceback.format_exc())
+        return False
+    Task.objects.filter(pk=task_id).update(status=Task.DONE,
+                                           locked_until=None, last_error='')
+    return True
+
+
+def _option(func, name, setting):
+    value = getattr(func, name, None)
+    return getattr(settings, setting) if value is None else value
+
+
+def _retry_or_fail(queued, func, error):
+    max_attempts = _option(func, 'max_attempts', 'POSTS_TASK_MAX_ATTEMPTS')
+    retry_delay = _option(func, 'retry_delay', 'POSTS_TASK_RETRY_DELAY')
+    values = {'status': Task.FAILED, 'locked_until': None,
+              'last_error': error[-4000:]}
+    if queued.attempts < max_attempts:
+        delay = retry_delay * 2 ** (queued.attempts - 1)
+        values.update(status=Task.PENDING,
+                      run_at=timezone.now() + timedelta(seconds=delay))
+    Task.objects.filter(pk=queued.pk).update(**values)
+
+
+def run_due(limit=100, workers=0):
+    """Выполняет до limit задач, которым пора, и возвращает их число."""
+    ids = list(due().order_by('run_at').values_list('pk', flat=True)[:limit])
+    if not workers or settings.POSTS_TASKS_EAGER:
+        results = [run(task_id) for task_id in ids]
+    else:
+        with ThreadPoolExecutor(max_workers=workers,
+                                thread_name_prefix='tasks') as pool:
+            results = list(pool.map(_run_in_thread, ids))
+    return sum(result is not None for result in results)
+
+
+def purge(days):
+    """Удаляет выполненные задачи старше days дней. Их ключи
+    освобождаются."""
+    before = timezone.now() - timedelta(days=days)
+    deleted, _ = Task.objects.filter(status=Task.DONE,
+                                     run_at__lt=before).delete()
+    return deleted
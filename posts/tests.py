@@ -1,17 +1,60 @@
 from django import template
-from django.http import response
-from django.test import TestCase, Client, override_settings
+from django.http import HttpResponse, response
+from django.template.backends.django import Template as DjangoTemplate
+from django.test import (SimpleTestCase, TestCase, Client, RequestFactory,
+                         override_settings)
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.models import Session
+from django.urls import resolve
 from django.urls.base import reverse
-from .models import Comment, Post, Group, Follow
+from .models import (Comment, Post, Group, Follow, ReplicaSync, Task,
+                     TimelineEntry)
+from . import (cards, comment_buffer, counters, dataset, feed_cache, gather,
+               images, tasks, thumbnails, timeline, views)
+from . import search as post_search
 from .forms import PostForm
+from yatube.metrics import QueryBudgetExceeded
+from yatube import metrics, replicas
+from yatube.sqlite import base as sqlite_backend
+from users.forms import CreationForm, reserved_usernames
+from users.models import Profile
 from PIL import Image
+from sorl.thumbnail import get_thumbnail
+import gzip
+import json
+import sqlite3
+import os
 import tempfile
+import threading
+import time
+from unittest import mock
+from unittest import skipUnless
+from io import BytesIO, StringIO
 from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import models
+from django.core.exceptions import ImproperlyConfigured
+from django.db import (IntegrityError, OperationalError, connection,
+                       connections, transaction)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from datetime import timedelta
 
 
 User = get_user_model()
 
+task_calls = []
+
+
+@tasks.task(max_attempts=2, retry_delay=60)
+def record_task(value):
+    task_calls.append(value)
+    if value == 'fail':
+        raise ValueError(value)
+
 
 class TestViewMethods(TestCase):
     def setUp(self):
@@ -314,3 +357,1641 @@ class TestCache(TestCase):
         cache.clear()
         new_response = self.client.get(index_url)
         self.assertContains(new_response, 'banana')
+
+
+@override_settings(POSTS_PAGINATION='cursor', POSTS_PER_PAGE=10)
+class TestCursorPagination(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create(username='user')
+        self.group_1 = Group.objects.create(
+                                            title='test_title',
+                                            slug='test_slug'
+                                            )
+        Post.objects.bulk_create(
+            Post(text=f'text_{i}', author=self.user, group=self.group_1)
+            for i in range(25)
+        )
+        # одинаковые pub_date проверяют разрешение ничьих по id
+        Post.objects.update(pub_date=Post.objects.first().pub_date)
+
+    def walk(self, url):
+        seen = []
+        cursor = None
+        while True:
+            response = self.client.get(url, {'cursor': cursor or ''})
+            page = response.context['page']
+            seen.extend(post.id for post in page)
+            if not page.has_next():
+                return seen, page
+            cursor = page.next_cursor
+
+    def test_walk_forward_all_feeds(self):
+        expected = list(
+            Post.objects.order_by('-pub_date', '-id')
+            .values_list('id', flat=True)
+        )
+        urls = [
+            reverse('index'),
+            reverse('group_posts', kwargs={'slug': self.group_1.slug}),
+            reverse('profile', kwargs={'username': self.user.username}),
+        ]
+        for url in urls:
+            seen, last_page = self.walk(url)
+            self.assertEqual(seen, expected)
+            self.assertEqual(len(last_page), 5)
+
+    def test_previous_cursor(self):
+        url = reverse('index')
+        first = self.client.get(url).context['page']
+        second = self.client.get(
+            url, {'cursor': first.next_cursor}).context['page']
+        self.assertFalse(first.has_previous())
+        self.assertTrue(second.has_previous())
+        back = self.client.get(
+            url, {'cursor': second.previous_cursor}).context['page']
+        self.assertEqual(list(back), list(first))
+        self.assertFalse(back.has_previous())
+
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        url = reverse('index')
+        first = self.client.get(url).context['page']
+        response = self.client.get(url, {'cursor': 'garbage!'})
+        self.assertEqual(list(response.context['page']), list(first))
+
+    @override_settings(POSTS_PAGINATION_COUNT=False)
+    def test_no_count_mode(self):
+        url = reverse('index')
+        first = self.client.get(url).context['page']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'cursor': first.next_cursor})
+        self.assertIsNone(response.context['paginator'].count)
+        self.assertFalse(
+            any('COUNT(' in query['sql'] for query in queries.captured_queries)
+        )
+        self.assertContains(response, '?cursor=')
+
+
+@override_settings(CACHES={
+    'default': {
+        'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+    }
+})
+class TestFeedQueryCount(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create(username='user')
+        self.author = User.objects.create(username='author')
+        self.client.force_login(self.user)
+        self.group_1 = Group.objects.create(
+                                            title='test_title',
+                                            slug='test_slug'
+                                            )
+        Follow.objects.create(user=self.user, author=self.author)
+
+    def create_posts(self, count):
+        for i in range(count):
+            post = Post.objects.create(
+                text=f'text_{i}',
+                author=self.author,
+                group=self.group_1
+            )
+            Comment.objects.create(post=post, author=self.user, text='comm')
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_feed_queries_do_not_grow_with_page_size(self):
+        # сессия, пользователь, COUNT(*) пагинатора и выборка страницы
+        expected = {
+            reverse('index'): 4,
+            reverse('group_posts', kwargs={'slug': self.group_1.slug}): 5,
+            reverse('profile', kwargs={'username': self.author.username}): 6,
+            reverse('follow_index'): 4,
+        }
+        self.create_posts(1)
+        for url, queries in expected.items():
+            with self.subTest(url=url):
+                self.assertEqual(self.count_queries(url), queries)
+        self.create_posts(9)
+        for url, queries in expected.items():
+            with self.subTest(url=url):
+                self.assertEqual(self.count_queries(url), queries)
+
+    def test_feed_page_joins_author_and_group(self):
+        self.create_posts(3)
+        with self.assertNumQueries(1):
+            cards = [(post.author.username, post.group.slug,
+                      post.comment_count)
+                     for post in Post.objects.for_feed()]
+        self.assertEqual(cards, [('author', 'test_slug', 1)] * 3)
+
+
+class TestCounters(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create(username='user')
+        self.author = User.objects.create(username='author')
+        self.client.force_login(self.user)
+
+    def assertProfile(self, user, posts, followers, following):
+        profile = Profile.objects.get(user=user)
+        self.assertEqual(
+            (profile.posts_count,
+             profile.followers_count,
+             profile.following_count),
+            (posts, followers, following)
+        )
+
+    def test_counters_follow_write_paths(self):
+        self.client.post(reverse('new_post'), {'text': 'test_text'})
+        post = Post.objects.get()
+        self.assertProfile(self.user, 1, 0, 0)
+
+        comment_url = reverse('add_comment',
+                              kwargs={
+                              'username': self.user.username,
+                              'post_id': post.id}
+                              )
+        self.client.post(comment_url, {'text': 'test_comm'})
+        self.client.post(comment_url, {'text': 'test_comm_2'})
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 2)
+
+        self.client.get(reverse('profile_follow',
+                                kwargs={'username': self.author.username}))
+        self.assertProfile(self.user, 1, 0, 1)
+        self.assertProfile(self.author, 0, 1, 0)
+        self.client.get(reverse('profile_unfollow',
+                                kwargs={'username': self.author.username}))
+        self.assertProfile(self.user, 1, 0, 0)
+        self.assertProfile(self.author, 0, 0, 0)
+
+        Comment.objects.filter(text='test_comm').delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+        post.delete()
+        self.assertProfile(self.user, 0, 0, 0)
+
+    def test_profile_page_uses_counters(self):
+        Post.objects.create(text='test_text', author=self.author)
+        Follow.objects.create(user=self.user, author=self.author)
+        url = reverse('profile', kwargs={'username': self.author.username})
+        response = self.client.get(url)
+        self.assertContains(response, 'Подписчиков: 1')
+        self.assertContains(response, 'Записей: 1')
+
+    def test_repair_counters(self):
+        post = Post.objects.create(text='test_text', author=self.author)
+        Comment.objects.create(post=post, author=self.user, text='comm')
+        Follow.objects.create(user=self.user, author=self.author)
+        Post.objects.update(comment_count=7)
+        Profile.objects.update(posts_count=0, followers_count=5)
+        Profile.objects.filter(user=self.user).delete()
+
+        out = StringIO()
+        call_command('repair_counters', '--check', stdout=out)
+        self.assertIn('Расхождений: постов 1, профилей 1', out.getvalue())
+        self.assertEqual(Post.objects.get().comment_count, 7)
+
+        call_command('repair_counters', stdout=StringIO())
+        self.assertEqual(Post.objects.get().comment_count, 1)
+        self.assertProfile(self.author, 1, 1, 0)
+        self.assertProfile(self.user, 0, 0, 1)
+
+
+@override_settings(POSTS_TIMELINE=True, POSTS_TIMELINE_FANOUT_LIMIT=1)
+class TestTimeline(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create(username='user')
+        self.author = User.objects.create(username='author')
+        self.celebrity = User.objects.create(username='celebrity')
+        self.fan = User.objects.create(username='fan')
+        self.client.force_login(self.user)
+
+    def follow_page(self):
+        response = self.client.get(reverse('follow_index'))
+        return [post.text for post in response.context['page']]
+
+    def test_fan_out_on_write(self):
+        Follow.objects.create(user=self.user, author=self.author)
+        self.client.force_login(self.author)
+        self.client.post(reverse('new_post'), {'text': 'fanned_out'})
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.user, post__text='fanned_out').exists())
+        self.client.force_login(self.user)
+        self.assertEqual(self.follow_page(), ['fanned_out'])
+
+    def test_celebrity_read_on_request(self):
+        Follow.objects.create(user=self.fan, author=self.celebrity)
+        Follow.objects.create(user=self.user, author=self.celebrity)
+        Post.objects.create(text='celebrity_post', author=self.celebrity)
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.follow_page(), ['celebrity_post'])
+
+    def test_backfill_and_remove(self):
+        Post.objects.create(text='old_post', author=self.author)
+        self.client.get(reverse('profile_follow',
+                                kwargs={'username': self.author.username}))
+        self.assertEqual(self.follow_page(), ['old_post'])
+        self.client.get(reverse('profile_unfollow',
+                                kwargs={'username': self.author.username}))
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.follow_page(), [])
+
+    def test_rebuild_timelines(self):
+        Follow.objects.create(user=self.user, author=self.author)
+        Post.objects.create(text='post', author=self.author)
+        TimelineEntry.objects.all().delete()
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertEqual(self.follow_page(), ['post'])
+
+    def test_posts_kept_when_author_drops_below_limit(self):
+        Follow.objects.create(user=self.user, author=self.celebrity)
+        Follow.objects.create(user=self.fan, author=self.celebrity)
+        Post.objects.create(text='celebrity_post', author=self.celebrity)
+        self.assertEqual(self.follow_page(), ['celebrity_post'])
+        Follow.objects.filter(user=self.fan).delete()
+        self.assertEqual(self.follow_page(), ['celebrity_post'])
+
+    def test_entries_copy_pub_date(self):
+        Follow.objects.create(user=self.user, author=self.author)
+        post = Post.objects.create(text='post', author=self.author)
+        self.assertEqual(TimelineEntry.objects.get(user=self.user).pub_date,
+                         post.pub_date)
+
+    @override_settings(POSTS_PAGINATION='cursor', POSTS_PER_PAGE=10)
+    def test_cursor_pages(self):
+        Follow.objects.create(user=self.user, author=self.author)
+        for i in range(25):
+            Post.objects.create(text=f'post_{i}', author=self.author)
+        seen = []
+        cursor = None
+        while True:
+            params = {'cursor': cursor} if cursor else {}
+            page = self.client.get(reverse('follow_index'),
+                                   params).context['page']
+            seen += [post.text for post in page]
+            if not page.has_next():
+                break
+            cursor = page.next_cursor
+        self.assertEqual(seen, [f'post_{i}' for i in range(24, -1, -1)])
+
+
+@override_settings(CACHES={
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'feed-cache-tests',
+    }
+})
+class TestFeedCache(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.user = User.objects.create(username='user')
+        self.group_1 = Group.objects.create(
+                                            title='test_title',
+                                            slug='test_slug'
+                                            )
+        for i in range(11):
+            Post.objects.create(text=f'post_{i}', author=self.user,
+                                group=self.group_1)
+        self.urls = [
+            reverse('index'),
+            reverse('group_posts', kwargs={'slug': self.group_1.slug}),
+            reverse('profile', kwargs={'username': self.user.username}),
+        ]
+
+    def test_pages_cached_separately(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url), 'post_10')
+                second = self.client.get(url, {'page': 2})
+                self.assertContains(second, 'post_0')
+                self.assertNotContains(second, 'post_10')
+
+    def test_hit_skips_post_query(self):
+        url = reverse('index')
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertContains(response, 'post_10')
+        self.assertFalse(any('"posts_post"."text"' in query['sql']
+                             for query in queries.captured_queries))
+
+    def test_junk_pages_reuse_keys(self):
+        for url in self.urls:
+            self.client.get(url)
+            self.client.get(url, {'page': 2})
+        entries = len(cache._cache)
+        for url in self.urls:
+            for page in ('junk', '99', '2.0', '-1'):
+                with self.subTest(url=url, page=page):
+                    self.assertEqual(
+                        self.client.get(url, {'page': page}).status_code,
+                        200)
+        self.assertEqual(len(cache._cache), entries)
+
+    @override_settings(POSTS_PAGINATION='cursor')
+    def test_junk_cursors_reuse_keys(self):
+        cursor = self.client.get(self.urls[0]).context['page'].next_cursor
+        self.client.get(self.urls[0], {'cursor': cursor})
+        entries = len(cache._cache)
+        # некорректные курсоры — первая страница, с «==» — та же вторая
+        for junk in ('junk', 'W10', cursor + '=='):
+            with self.subTest(cursor=junk):
+                self.assertEqual(
+                    self.client.get(self.urls[0],
+                                    {'cursor': junk}).status_code,
+                    200)
+        self.assertEqual(len(cache._cache), entries)
+
+    def test_fragments_and_generations_expire(self):
+        for url in self.urls:
+            self.client.get(url)
+        expiry = cache._expire_info
+        self.assertTrue(expiry)
+        self.assertNotIn(None, expiry.values())
+
+    def test_writes_invalidate_feeds(self):
+        for url in self.urls:
+            self.client.get(url)
+        post = Post.objects.create(text='banana', author=self.user,
+                                   group=self.group_1)
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url), 'banana')
+
+        Comment.objects.create(post=post, author=self.user, text='comm')
+        self.assertContains(self.client.get(self.urls[0]), 'Комментариев: 1')
+
+        group_2 = Group.objects.create(title='test_title2', slug='test_slug2')
+        self.client.get(reverse('group_posts',
+                                kwargs={'slug': group_2.slug}))
+        post.group = group_2
+        post.save()
+        self.assertNotContains(self.client.get(self.urls[1]), 'banana')
+        self.assertContains(
+            self.client.get(reverse('group_posts',
+                                    kwargs={'slug': group_2.slug})),
+            'banana'
+        )
+
+        post.delete()
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertNotContains(self.client.get(url), 'banana')
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN проверяется на SQLite')
+class TestFeedIndexes(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='user')
+        self.author = User.objects.create(username='author')
+        self.group_1 = Group.objects.create(
+                                            title='test_title',
+                                            slug='test_slug'
+                                            )
+        self.post = Post.objects.create(text='test_text', author=self.user,
+                                        group=self.group_1)
+
+    def test_feed_queries_use_indexes(self):
+        cases = [
+            (Post.objects.for_feed()[:10], 'post_pub_date_idx'),
+            (Post.objects.order_by('-pub_date', '-id')[:10],
+             'post_pub_date_idx'),
+            (self.group_1.group_posts.for_feed()[:10],
+             'post_group_pub_date_idx'),
+            (self.user.author_posts.for_feed()[:10],
+             'post_author_pub_date_idx'),
+            (timeline.posts_for(self.author)[:10], 'post_pub_date_idx'),
+            (self.post.comment.order_by('created', 'id'),
+             'comment_post_created_idx'),
+            (Follow.objects.filter(user=self.user, author=self.author),
+             'USING COVERING INDEX sqlite_autoindex_posts_follow_1'),
+        ]
+        for queryset, index in cases:
+            with self.subTest(index=index):
+                plan = queryset.explain()
+                self.assertIn(index, plan)
+                self.assertNotIn('TEMP B-TREE', plan)
+
+    @override_settings(POSTS_TIMELINE=True)
+    def test_timeline_uses_index(self):
+        Follow.objects.create(user=self.author, author=self.user)
+        plan = timeline.posts_for(self.author)[:11].explain()
+        self.assertIn('timeline_feed_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_follow_is_unique(self):
+        Follow.objects.create(user=self.user, author=self.author)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Follow.objects.create(user=self.user, author=self.author)
+
+
+@override_settings(QUERY_BUDGET_STRICT=True, CACHES={
+    'default': {
+        'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+    }
+})
+class TestQueryBudget(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create(username='user')
+        self.author = User.objects.create(username='author')
+        self.client.force_login(self.user)
+        self.group_1 = Group.objects.create(
+                                            title='test_title',
+                                            slug='test_slug'
+                                            )
+        Follow.objects.create(user=self.user, author=self.author)
+        for i in range(12):
+            post = Post.objects.create(text=f'text_{i}', author=self.author,
+                                       group=self.group_1)
+            Comment.objects.create(post=post, author=self.user, text='comm')
+
+    def test_views_fit_budgets(self):
+        urls = [
+            reverse('index'),
+            reverse('group_posts', kwargs={'slug': self.group_1.slug}),
+            reverse('profile', kwargs={'username': self.author.username}),
+            reverse('follow_index'),
+            reverse('new_post'),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_budget_exceeded(self):
+        with mock.patch.object(views.index, 'query_budget', 1):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get(reverse('index'))
+        with override_settings(QUERY_BUDGET_STRICT=False), \
+                mock.patch.object(views.index, 'query_budget', 1), \
+                self.assertLogs('yatube.metrics', 'WARNING'):
+            self.client.get(reverse('index'))
+
+    def test_budget_catches_n_plus_one(self):
+        urls = [
+            reverse('index'),
+            reverse('group_posts', kwargs={'slug': self.group_1.slug}),
+            reverse('profile', kwargs={'username': self.author.username}),
+            reverse('follow_index'),
+        ]
+        # без select_related каждая карточка читает автора и сообщество
+        with mock.patch('posts.models.PostQuerySet.for_feed',
+                        lambda queryset: queryset.all()):
+            for url in urls:
+                with self.subTest(url=url), \
+                        self.assertRaises(QueryBudgetExceeded):
+                    self.client.get(url)
+
+    def test_template_timing_scoped_to_requests(self):
+        render = DjangoTemplate.render
+        metrics._samples.clear()
+        self.client.get(reverse('index'))
+        self.assertIs(DjangoTemplate.render, render)
+        self.assertGreater(metrics._samples['index'][-1]['template_time'],
+                           0)
+
+    def test_metrics_report(self):
+        self.client.get(reverse('index'))
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 302)
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        report = self.client.get(reverse('metrics')).json()
+        self.assertIn('index', report)
+        self.assertEqual(set(report['index']['queries']),
+                         {'p50', 'p95', 'p99'})
+
+    def test_query_report_command(self):
+        with tempfile.NamedTemporaryFile('r', suffix='.ndjson') as log:
+            with override_settings(QUERY_METRICS_LOG=log.name):
+                self.client.get(reverse('index'))
+                self.client.get(reverse('index'))
+            out = StringIO()
+            call_command('query_report', '--log', log.name, '--json',
+                         stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['index']['requests'], 2)
+
+
+@override_settings(CACHES={
+    'default': {
+        'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+    }
+})
+class TestThumbnails(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create(username='user')
+        buffer = BytesIO()
+        Image.new('RGB', (60, 30), color='red').save(buffer, 'PNG')
+        self.post = Post.objects.create(
+            text='post with image',
+            author=self.user,
+            image=SimpleUploadedFile('thumb.png', buffer.getvalue())
+        )
+
+    def test_placeholder_until_generated(self):
+        geometry, options = thumbnails.SIZES[0]
+        self.assertIsNone(
+            thumbnails.lookup(self.post.image, geometry, **options))
+        response = self.client.get(reverse('index'))
+        self.assertContains(response, 'Картинка готовится')
+        self.assertNotContains(response, self.post.image.url)
+
+        thumbnails.generate(self.post.image.name)
+        thumbnail = thumbnails.lookup(self.post.image, geometry, **options)
+        self.assertEqual(
+            thumbnail.name,
+            get_thumbnail(self.post.image, geometry, **options).name
+        )
+        response = self.client.get(reverse('index'))
+        self.assertContains(response, thumbnail.url)
+        self.assertNotContains(response, self.post.image.url)
+
+    def test_generate_thumbnails_command(self):
+        out = StringIO()
+        call_command('generate_thumbnails', stdout=out)
+        self.assertIn('Готово: создано 1, пропущено 0', out.getvalue())
+        self.assertTrue(thumbnails.is_ready(self.post.image))
+
+        out = StringIO()
+        call_command('generate_thumbnails', stdout=out)
+        self.assertIn('Готово: создано 0, пропущено 1', out.getvalue())
+
+    def test_generate_thumbnails_force(self):
+        thumbnails.generate(self.post.image.name)
+        geometry, options = thumbnails.SIZES[0]
+        thumbnail = thumbnails.lookup(self.post.image, geometry, **options)
+        path = thumbnail.storage.path(thumbnail.name)
+        with open(path, 'wb') as file:
+            file.write(b'stale')
+
+        call_command('generate_thumbnails', '--force', stdout=StringIO())
+        with Image.open(path) as image:
+            self.assertEqual(image.size, (960, 339))
+
+    def test_generate_thumbnails_resume(self):
+        later = Post.objects.create(text='later', author=self.user,
+                                    image=self.post.image.name)
+        with tempfile.TemporaryDirectory() as directory:
+            state = os.path.join(directory, 'thumbnails.state')
+            with open(state, 'w') as file:
+                file.write(str(self.post.pk))
+            out = StringIO()
+            call_command('generate_thumbnails', '--state', state,
+                         '--force', stdout=out)
+            with open(state) as file:
+                self.assertEqual(file.read(), str(later.pk))
+        self.assertIn('Готово: создано 1, пропущено 0', out.getvalue())
+
+
+class TestExport(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create(username='user', is_staff=True)
+        self.author = User.objects.create(username='author')
+        self.group_1 = Group.objects.create(
+                                            title='test_title',
+                                            slug='test_slug'
+                                            )
+        self.post = Post.objects.create(text='в группе', author=self.author,
+                                        group=self.group_1)
+        Post.objects.create(text='без группы', author=self.user)
+        Comment.objects.create(post=self.post, author=self.user, text='comm')
+        Follow.objects.create(user=self.user, author=self.author)
+
+    def export(self, *args):
+        out = StringIO()
+        call_command('export_ndjson', *args, stdout=out)
+        return [json.loads(line) for line in out.getvalue().splitlines()]
+
+    def test_export_command(self):
+        posts = self.export('posts')
+        self.assertEqual([post['text'] for post in posts],
+                         ['в группе', 'без группы'])
+        self.assertEqual(posts[0]['author'], 'author')
+        self.assertEqual(posts[0]['group'], 'test_slug')
+        self.assertEqual(self.export('posts', '--group', 'test_slug'),
+                         posts[:1])
+        self.assertEqual(self.export('posts', '--author', 'user'), posts[1:])
+        self.assertEqual(self.export('posts', '--since', '2000-01-01',
+                                     '--until', '2000-12-31'), [])
+        self.assertEqual(self.export('comments')[0]['post'], self.post.id)
+        self.assertEqual(self.export('follows'),
+                         [{'id': Follow.objects.get().id,
+                           'user': 'user', 'author': 'author'}])
+
+    def test_export_command_gzip(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'posts.ndjson.gz')
+            call_command('export_ndjson', 'posts', '--output', path)
+            with gzip.open(path, 'rt') as file:
+                self.assertEqual(len(file.readlines()), 2)
+
+    def test_export_view(self):
+        url = reverse('export', kwargs={'table': 'posts'})
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(self.user)
+        response = self.client.get(url, {'author': 'author'})
+        content = b''.join(response.streaming_content).decode()
+        self.assertEqual(json.loads(content)['text'], 'в группе')
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        content = gzip.decompress(b''.join(response.streaming_content))
+        self.assertEqual(len(content.splitlines()), 2)
+
+        bad_url = reverse('export', kwargs={'table': 'users'})
+        self.assertEqual(self.client.get(bad_url).status_code, 400)
+        response = self.client.get(url, {'since': 'вчера'})
+        self.assertEqual(response.status_code, 400)
+
+
+class TestImport(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='user')
+        self.author = User.objects.create(username='author')
+        self.group_1 = Group.objects.create(
+                                            title='test_title',
+                                            slug='test_slug'
+                                            )
+        self.post = Post.objects.create(text='в группе', author=self.author,
+                                        group=self.group_1)
+        Comment.objects.create(post=self.post, author=self.user, text='comm')
+        Follow.objects.create(user=self.user, author=self.author)
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def load(self, table, path, *args):
+        out, err = StringIO(), StringIO()
+        call_command('import_ndjson', table, path, *args,
+                     stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_roundtrip(self):
+        pub_date = self.post.pub_date
+        for table in ('posts', 'comments', 'follows'):
+            call_command('export_ndjson', table,
+                         '--output', self.path(f'{table}.ndjson.gz'))
+        Post.objects.all().delete()
+        Follow.objects.all().delete()
+        for table in ('posts', 'comments', 'follows'):
+            out, err = self.load(table, self.path(f'{table}.ndjson.gz'))
+            self.assertIn('загружено 1', out)
+            self.assertEqual(err, '')
+        post = Post.objects.get()
+        self.assertEqual(post.pk, self.post.pk)
+        self.assertEqual(post.pub_date, pub_date)
+        self.assertEqual(post.group, self.group_1)
+        self.assertEqual(post.comment_count, 1)
+        profile = Profile.objects.get(user=self.author)
+        self.assertEqual((profile.posts_count, profile.followers_count),
+                         (1, 1))
+
+    def test_reimport_existing(self):
+        for table in ('posts', 'follows'):
+            call_command('export_ndjson', table,
+                         '--output', self.path(f'{table}.ndjson'))
+        with open(self.path('posts.ndjson'), 'a') as file:
+            file.write(json.dumps({'id': self.post.pk + 100, 'text': 'новый',
+                                   'author': 'user'}) + '\n')
+
+        out, err = self.load('posts', self.path('posts.ndjson'))
+        self.assertIn('загружено 0, отклонено 2', out)
+        self.assertIn('--skip-existing', err)
+        out, err = self.load('posts', self.path('posts.ndjson'),
+                             '--skip-existing')
+        self.assertIn('загружено 1, отклонено 0, пропущено существующих 1',
+                      out)
+        self.assertEqual(Post.objects.count(), 2)
+        out, err = self.load('follows', self.path('follows.ndjson'))
+        self.assertIn('загружено 0, отклонено 0, пропущено существующих 1',
+                      out)
+
+    def test_dates_kept(self):
+        with open(self.path('posts.ndjson'), 'w') as file:
+            file.write(json.dumps({'text': 'старый', 'author': 'user',
+                                   'pub_date': '2020-01-02T03:04:05Z'}))
+        self.load('posts', self.path('posts.ndjson'))
+        post = Post.objects.get(text='старый')
+        self.assertEqual(post.pub_date.year, 2020)
+        self.assertIsNotNone(post.updated)
+
+    def test_finish_touches_only_imported_rows(self):
+        bystander = User.objects.create(username='bystander')
+        Profile.objects.filter(user=bystander).update(posts_count=7)
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM posts_post_fts')
+        rows = [{'text': 'котик без id', 'author': 'user'},
+                {'id': self.post.pk + 50, 'text': 'котик с id',
+                 'author': 'new_user'}]
+        with open(self.path('posts.ndjson'), 'w') as file:
+            file.writelines(json.dumps(row) + '\n' for row in rows)
+        self.load('posts', self.path('posts.ndjson'), '--create-missing')
+        self.assertEqual(Profile.objects.get(user=self.user).posts_count, 1)
+        self.assertEqual(
+            Profile.objects.get(user__username='new_user').posts_count, 1)
+        # чужие счётчики и индекс не пересчитываются
+        self.assertEqual(Profile.objects.get(user=bystander).posts_count, 7)
+        found = post_search.backend().search('котик')
+        self.assertEqual(sorted(post.text for post in found[:10]),
+                         ['котик без id', 'котик с id'])
+        self.assertEqual(len(post_search.backend().search('группе')), 0)
+
+    def test_invalid_rows_rejected(self):
+        rows = [{'text': 'новый', 'author': 'user'},
+                {'text': '', 'author': 'user'},
+                {'text': 'чужой', 'author': 'nobody'},
+                {'text': 'без группы', 'author': 'user', 'group': 'none'}]
+        with open(self.path('posts.ndjson'), 'w') as file:
+            file.writelines(json.dumps(row) + '\n' for row in rows)
+            file.write('{не json\n')
+        out, err = self.load('posts', self.path('posts.ndjson'))
+        self.assertIn('загружено 1, отклонено 4', out)
+        self.assertEqual(len(err.splitlines()), 4)
+        self.assertEqual(Profile.objects.get(user=self.user).posts_count, 1)
+
+        out, err = self.load('posts', self.path('posts.ndjson'),
+                             '--create-missing')
+        self.assertTrue(Profile.objects.filter(
+            user__username='nobody', posts_count=1).exists())
+
+
+class TestSearch(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create(username='user')
+        self.cat = Post.objects.create(text='Котики спят <b>весь</b> день',
+                                       author=self.user)
+        self.dog = Post.objects.create(text='Собака и котик гуляют',
+                                       author=self.user)
+        Post.objects.create(text='Про погоду', author=self.user)
+
+    def search(self, query, **params):
+        response = self.client.get(reverse('search'), dict(params, q=query))
+        return response.context['page']
+
+    def test_search_view(self):
+        page = self.search('котик')
+        self.assertEqual({post.pk for post in page},
+                         {self.cat.pk, self.dog.pk})
+        self.assertEqual(len(self.search('котик собака')), 1)
+        self.assertEqual(len(self.search('')), 0)
+        self.assertEqual(len(self.search('"*)(')), 0)
+
+    def test_snippet_escaped(self):
+        response = self.client.get(reverse('search'), {'q': 'спят'})
+        self.assertContains(response, '<mark>спят</mark>')
+        self.assertContains(response, '&lt;b&gt;весь&lt;/b&gt;')
+
+    def test_index_follows_changes(self):
+        self.cat.text = 'Теперь про рыбок'
+        self.cat.save()
+        self.assertEqual([post.pk for post in self.search('котик')],
+                         [self.dog.pk])
+        self.assertEqual([post.pk for post in self.search('рыбок')],
+                         [self.cat.pk])
+        self.dog.delete()
+        self.assertEqual(len(self.search('котик')), 0)
+
+    def test_pagination(self):
+        for i in range(12):
+            Post.objects.create(text=f'котик номер {i}', author=self.user)
+        response = self.client.get(reverse('search'), {'q': 'котик'})
+        self.assertEqual(response.context['paginator'].count, 14)
+        self.assertContains(response, 'q=%D0%BA%D0%BE%D1%82%D0%B8%D0%BA&page=2')
+        self.assertEqual(len(self.search('котик', page=2)), 4)
+
+    def test_rebuild_and_like_backend(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM posts_post_fts')
+        self.assertEqual(len(self.search('котик')), 0)
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('3', out.getvalue())
+        self.assertEqual(len(self.search('котик')), 2)
+        with override_settings(
+                POSTS_SEARCH_BACKEND='posts.search.LikeBackend'):
+            page = self.search('спят')
+            self.assertEqual([post.pk for post in page], [self.cat.pk])
+            self.assertIn('<mark>спят</mark>', page[0].snippet)
+
+
+class TestPostCards(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.user = User.objects.create(username='user')
+        self.author = User.objects.create(username='author')
+        self.post = Post.objects.create(text='карточка', author=self.author)
+
+    def test_card_reused(self):
+        key = cards.card_key(self.post, AnonymousUser())
+        cards.render_cards([self.post], AnonymousUser())
+        self.assertIn('карточка', cache.get(key))
+        cache.set(key, 'из кэша')
+        self.assertEqual(cards.render_cards([self.post], AnonymousUser()),
+                         'из кэша')
+
+    def test_key_changes_on_edit_and_comment(self):
+        key = cards.card_key(self.post, self.user)
+        self.post.text = 'новый текст'
+        self.post.save()
+        edited = cards.card_key(self.post, self.user)
+        self.assertNotEqual(key, edited)
+        Comment.objects.create(post=self.post, author=self.user, text='comm')
+        self.post.refresh_from_db()
+        self.assertNotEqual(edited, cards.card_key(self.post, self.user))
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('index'))
+        self.assertContains(response, 'новый текст')
+        self.assertContains(response, 'Комментариев: 1')
+
+    def test_key_changes_on_group_and_author_rename(self):
+        group = Group.objects.create(title='OldTitle', slug='group')
+        self.post.group = group
+        self.post.save()
+        urls = [reverse('index'),
+                reverse('group_posts', kwargs={'slug': 'group'}),
+                reverse('profile', kwargs={'username': 'author'})]
+        for url in urls:
+            self.assertContains(self.client.get(url), '#OldTitle')
+        group.title = 'NewTitle'
+        group.save()
+        self.author.username = 'renamed'
+        self.author.save()
+        urls[2] = reverse('profile', kwargs={'username': 'renamed'})
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertNotContains(response, '#OldTitle')
+                self.assertContains(response, '#NewTitle')
+                self.assertContains(response, '@renamed')
+
+    def test_viewer_variants(self):
+        anon = cards.render_cards([self.post], AnonymousUser())
+        user = cards.render_cards([self.post], self.user)
+        author = cards.render_cards([self.post], self.author)
+        self.assertNotIn('Добавить комментарий', anon)
+        self.assertIn('Добавить комментарий', user)
+        self.assertNotIn('Редактировать', user)
+        self.assertIn('Редактировать', author)
+
+
+class TestDataset(TestCase):
+    def generate(self, prefix):
+        out = StringIO()
+        call_command('generate_dataset', '--users', '30', '--groups', '3',
+                     '--posts', '300', '--comments', '200',
+                     '--follows', '100', '--prefix', prefix, stdout=out)
+        users = User.objects.filter(username__startswith=prefix)
+        first = users.order_by('pk').first().pk
+        return users, [author_id - first for author_id in Post.objects.filter(
+            author__in=users).order_by('pk').values_list('author_id',
+                                                           flat=True)]
+
+    def test_generate(self):
+        users, authors = self.generate('a_')
+        self.assertEqual(users.count(), 30)
+        self.assertEqual(len(authors), 300)
+        self.assertEqual(Comment.objects.count(), 200)
+        self.assertTrue(0 < Follow.objects.count() <= 100)
+        # степенной закон: самый активный автор пишет больше всех
+        self.assertGreater(authors.count(0), authors.count(29) * 3)
+        self.assertFalse(Follow.objects.filter(
+            user=models.F('author')).exists())
+        self.assertEqual(counters.repair(Profile.objects.all(),
+                                         counters.profile_counters(),
+                                         fix=False), 0)
+        self.assertEqual(counters.repair(Post.objects.all(),
+                                         counters.post_counters(),
+                                         fix=False), 0)
+        self.assertEqual(len(post_search.backend().search('котик')), len([
+            text for text in Post.objects.values_list('text', flat=True)
+            if 'котик' in text]))
+
+    def test_deterministic_by_seed(self):
+        _, first = self.generate('a_')
+        _, second = self.generate('b_')
+        self.assertEqual(first, second)
+        with self.assertRaises(CommandError):
+            self.generate('a_')
+
+    def test_dates_do_not_depend_on_run_time(self):
+        self.generate('a_')
+        self.generate('b_')
+        dates = [list(Post.objects.filter(
+            author__username__startswith=prefix).order_by('pk').values_list(
+                'pub_date', flat=True)) for prefix in ('a_', 'b_')]
+        self.assertEqual(dates[0], dates[1])
+        self.assertLess(dates[0][-1], dataset.END)
+        self.assertGreater(dates[0][-1], dataset.END - timedelta(days=2))
+
+
+class TestConditionalGet(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.user = User.objects.create(username='user')
+        self.author = User.objects.create(username='author')
+        self.group_1 = Group.objects.create(
+                                            title='test_title',
+                                            slug='test_slug'
+                                            )
+        self.post = Post.objects.create(text='текст', author=self.author,
+                                        group=self.group_1)
+        self.urls = [
+            reverse('index'),
+            reverse('group_posts', kwargs={'slug': 'test_slug'}),
+            reverse('profile', kwargs={'username': 'author'}),
+            reverse('post', kwargs={'username': 'author',
+                                    'post_id': self.post.id}),
+        ]
+
+    def etags(self):
+        return [self.client.get(url)['ETag'] for url in self.urls]
+
+    def test_not_modified(self):
+        # главной хватает поколения из кэша, остальным — одного запроса
+        queries = [0, 1, 1, 1]
+        for url, etag, count in zip(self.urls, self.etags(), queries):
+            with self.subTest(url=url), self.assertNumQueries(count):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response.content, b'')
+
+    def test_etag_changes(self):
+        etags = self.etags()
+        Comment.objects.create(post=self.post, author=self.user, text='comm')
+        commented = self.etags()
+        for old, new in zip(etags, commented):
+            self.assertNotEqual(old, new)
+
+        Follow.objects.create(user=self.user, author=self.author)
+        followed = self.etags()
+        self.assertEqual(followed[:2], commented[:2])
+        self.assertNotEqual(followed[2:], commented[2:])
+
+        self.client.force_login(self.user)
+        self.assertNotEqual(self.etags(), followed)
+        self.assertNotEqual(
+            self.client.get(self.urls[0], {'page': 2})['ETag'],
+            self.client.get(self.urls[0])['ETag'])
+
+    def test_etag_hides_viewer(self):
+        self.client.force_login(self.user)
+        other = Client()
+        other.force_login(self.author)
+        for url in self.urls:
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                self.assertIn(f':{feed_cache.viewer_key(self.user)}', etag)
+                self.assertNotEqual(other.get(url)['ETag'], etag)
+        self.assertEqual(len(feed_cache.viewer_key(self.user)), 16)
+        self.assertNotEqual(feed_cache.viewer_key(self.user),
+                            feed_cache.viewer_key(self.author))
+
+    def test_junk_cursor_keeps_etag(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertEqual(
+                    self.client.get(url, {'cursor': 'junk'})['ETag'],
+                    self.client.get(url)['ETag'])
+
+    def test_missing_objects(self):
+        response = self.client.get(
+            reverse('group_posts', kwargs={'slug': 'nothing'}))
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(
+            reverse('post', kwargs={'username': 'user',
+                                    'post_id': self.post.id}))
+        self.assertEqual(response.status_code, 404)
+
+
+class TestSqliteBackend(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'db.sqlite3')
+
+    def wrapper(self, **options):
+        settings_dict = {**connection.settings_dict, 'NAME': self.path,
+                         'OPTIONS': options}
+        db = sqlite_backend.DatabaseWrapper(settings_dict)
+        self.addCleanup(db.close)
+        return db
+
+    def test_pragmas(self):
+        db = self.wrapper(pragmas={'busy_timeout': 1234})
+        with db.cursor() as cursor:
+            for name, expected in (('journal_mode', 'wal'),
+                                   ('synchronous', 1),
+                                   ('busy_timeout', 1234)):
+                cursor.execute(f'PRAGMA {name}')
+                self.assertEqual(cursor.fetchone()[0], expected)
+
+    def test_transaction_takes_write_lock(self):
+        for mode, locked in (('IMMEDIATE', True), ('DEFERRED', False)):
+            with self.subTest(mode=mode):
+                first = self.wrapper(transaction_mode=mode)
+                second = self.wrapper(pragmas={'busy_timeout': 0})
+                with first.cursor() as cursor:
+                    cursor.execute('CREATE TABLE IF NOT EXISTS t (x)')
+                first.set_autocommit(
+                    False, force_begin_transaction_with_broken_autocommit=True)
+                try:
+                    with second.cursor() as cursor:
+                        if locked:
+                            with self.assertRaises(OperationalError):
+                                cursor.execute('INSERT INTO t VALUES (1)')
+                        else:
+                            cursor.execute('INSERT INTO t VALUES (1)')
+                finally:
+                    first.rollback()
+                    first.set_autocommit(True)
+
+    def test_read_only_replica_transaction(self):
+        with self.wrapper().cursor() as cursor:
+            cursor.execute('CREATE TABLE t (x)')
+        for mode, works in (('IMMEDIATE', False), ('DEFERRED', True)):
+            with self.subTest(mode=mode):
+                replica = self.wrapper(pragmas={'query_only': 1},
+                                       transaction_mode=mode)
+                replica.ensure_connection()
+                try:
+                    replica.set_autocommit(
+                        False,
+                        force_begin_transaction_with_broken_autocommit=True)
+                    with replica.cursor() as cursor:
+                        cursor.execute('SELECT count(*) FROM t')
+                        self.assertEqual(cursor.fetchone()[0], 0)
+                except OperationalError as e:
+                    self.assertFalse(works, e)
+                    self.assertIn('readonly', str(e))
+                else:
+                    self.assertTrue(works)
+                finally:
+                    replica.rollback()
+                    replica.set_autocommit(True)
+
+    def test_unknown_transaction_mode(self):
+        with self.assertRaises(ImproperlyConfigured):
+            self.wrapper(transaction_mode='LAZY').ensure_connection()
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'],
+                   DATABASE_REPLICA_MAX_LAG=10)
+class TestReplicas(TestCase):
+    def setUp(self):
+        cache.clear()
+        # реплика — зеркало тестовой базы, как с TEST['MIRROR']
+        connections.databases['replica1'] = connections.databases['default']
+        connections['replica1'] = connections['default']
+        self.addCleanup(connections.databases.pop, 'replica1')
+        self.addCleanup(delattr, connections._connections, 'replica1')
+        replicas.mark_synced()
+        self.router = replicas.ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def read_database(self, request, model=Post):
+        """Куда ушло бы чтение model внутри view с replica_reads."""
+        chosen = []
+
+        @replicas.replica_reads
+        def view(request):
+            chosen.append(self.router.db_for_read(model))
+            return HttpResponse()
+
+        response = replicas.ReplicaMiddleware(view)(request)
+        return chosen[0], response
+
+    def test_reads(self):
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+        self.assertEqual(self.read_database(self.factory.get('/'))[0],
+                         'replica1')
+        self.assertEqual(self.read_database(self.factory.post('/'))[0],
+                         'default')
+        self.assertEqual(self.read_database(self.factory.get('/'),
+                                            Session)[0], 'default')
+        with override_settings(DATABASE_REPLICAS=[]):
+            self.assertEqual(self.read_database(self.factory.get('/'))[0],
+                             'default')
+
+    def test_sticky_after_write(self):
+        user = User.objects.create_user(username='writer')
+        self.client.force_login(user)
+        response = self.client.post(reverse('new_post'), {'text': 'пост'})
+        wrote_at = float(response.cookies[replicas.COOKIE].value)
+        self.assertAlmostEqual(wrote_at, time.time(), delta=2)
+        self.assertEqual(response.cookies[replicas.COOKIE]['max-age'], 10)
+
+        # реплика снята до записи
+        request = self.factory.get('/')
+        request.COOKIES[replicas.COOKIE] = str(wrote_at)
+        self.assertEqual(self.read_database(request)[0], 'default')
+        replicas.mark_synced(wrote_at + 1)
+        database, response = self.read_database(request)
+        self.assertEqual(database, 'replica1')
+        self.assertNotIn(replicas.COOKIE, response.cookies)
+
+    def test_fresh_feed_reads_primary(self):
+        feed_cache.bump(feed_cache.index_scope())
+        request = self.factory.get('/')
+        request.user = AnonymousUser()
+        chosen = []
+
+        @replicas.replica_reads
+        def view(request):
+            feed_cache.fragment_key(request, feed_cache.index_scope())
+            chosen.append(self.router.db_for_read(Post))
+            return HttpResponse()
+
+        # снимок реплики старше изменения ленты
+        view(request)
+        replicas.mark_synced(time.time() + 1)
+        view(request)
+        self.assertEqual(chosen, ['default', 'replica1'])
+
+    def test_lagging_replica_not_used(self):
+        request = self.factory.get('/')
+        self.assertEqual(self.read_database(request)[0], 'replica1')
+        with mock.patch('time.time', return_value=time.time() + 11):
+            self.assertEqual(self.read_database(request)[0], 'default')
+        ReplicaSync.objects.all().delete()
+        replicas._synced.clear()
+        self.assertEqual(self.read_database(request)[0], 'default')
+
+    def test_synced_at_read_from_replica(self):
+        reads = []
+        with CaptureQueriesContext(connections['replica1']) as queries:
+            replicas._synced.clear()
+            reads.append(replicas.synced_at('replica1'))
+            reads.append(replicas.synced_at('replica1'))
+        self.assertIsNotNone(reads[0])
+        self.assertEqual(reads[0], reads[1])
+        # второй раз — из памяти процесса
+        self.assertEqual(len(queries), 1)
+
+    def test_sync_replicas_marks_snapshot(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        replica = os.path.join(directory.name, 'replica.sqlite3')
+        source = os.path.join(directory.name, 'db.sqlite3')
+        with sqlite3.connect(source) as db:
+            db.execute('CREATE TABLE posts_replicasync '
+                       '(id integer PRIMARY KEY, synced real)')
+        db.close()
+        databases = {
+            alias: mock.Mock(vendor='sqlite', settings_dict={'NAME': name})
+            for alias, name in (('default', source), ('replica1', replica))
+        }
+        before = time.time()
+        with mock.patch('posts.management.commands.sync_replicas.connections',
+                        databases):
+            call_command('sync_replicas', stdout=StringIO())
+        with sqlite3.connect(replica) as db:
+            (synced,), = db.execute('SELECT synced FROM posts_replicasync')
+        db.close()
+        self.assertGreaterEqual(synced, before)
+
+    def test_profile_author_read_from_primary(self):
+        author = User.objects.create(username='new_author')
+        request = self.factory.get('/')
+        request.user = AnonymousUser()
+        chosen = []
+        db_for_read = replicas.ReplicaRouter.db_for_read
+
+        def record(router, model, **hints):
+            database = db_for_read(router, model, **hints)
+            chosen.append((model, database))
+            return database
+
+        with replicas.reading_from('replica1'), \
+                mock.patch.object(replicas.ReplicaRouter, 'db_for_read',
+                                  record):
+            self.assertIsNotNone(views.profile_etag(request,
+                                                    author.username))
+        self.assertEqual(chosen[0], (User, 'default'))
+
+    def test_writes_and_migrations_stay_on_primary(self):
+        self.assertEqual(self.router.db_for_write(Post), 'default')
+        self.assertTrue(self.router.allow_migrate('default', 'posts'))
+        self.assertFalse(self.router.allow_migrate('replica1', 'posts'))
+
+
+class TestGather(TestCase):
+    @override_settings(POSTS_GATHER_WORKERS=0)
+    def test_inline_without_workers(self):
+        names = gather.gather(lambda: threading.current_thread().name,
+                              lambda: threading.current_thread().name)
+        self.assertEqual(set(names), {threading.current_thread().name})
+
+    @override_settings(POSTS_GATHER_WORKERS=2)
+    def test_pool_keeps_request_context(self):
+        sample = metrics.Sample(queries=0, db_time=0.0)
+
+        def query():
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            return threading.current_thread().name, replicas.current()
+
+        with mock.patch('yatube.metrics.current_sample', return_value=sample), \
+                replicas.reading_from('replica1'):
+            first, (thread, replica) = gather.gather(lambda: 1, query)
+        self.assertEqual(first, 1)
+        self.assertTrue(thread.startswith('gather'))
+        self.assertEqual(replica, 'replica1')
+        self.assertEqual(sample['queries'], 1)
+
+
+@override_settings(POSTS_COMMENTS_PER_PAGE=3)
+class TestComments(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create(username='author')
+        self.post = Post.objects.create(text='text', author=self.author)
+        self.url = reverse('post', args=['author', self.post.pk])
+
+    def add_comments(self, count):
+        start = User.objects.count()
+        users = [User.objects.create(username=f'commenter_{i}')
+                 for i in range(start, start + count)]
+        for user in users:
+            Comment.objects.create(post=self.post, author=user,
+                                   text=f'comment of {user.username}')
+
+    def texts(self, response):
+        return [comment.text for comment in response.context['comment_page']]
+
+    def test_queries_do_not_grow_with_comments(self):
+        counts = []
+        for count in (1, 10):
+            self.add_comments(count)
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(self.url)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+        self.assertEqual(len(self.texts(response)), 3)
+        self.assertContains(response, 'Показать ещё комментарии')
+
+    def test_load_more(self):
+        self.add_comments(5)
+        response = self.client.get(self.url)
+        page = response.context['comment_page']
+        fragment = self.client.get(
+            reverse('post_comments', args=['author', self.post.pk]),
+            {'cursor': page.next_cursor})
+        self.assertEqual(
+            self.texts(response) + self.texts(fragment),
+            list(Comment.objects.order_by('created', 'id')
+                 .values_list('text', flat=True)))
+        self.assertNotContains(fragment, 'Показать ещё комментарии')
+        self.assertNotContains(fragment, '<form')
+        self.assertTemplateNotUsed(fragment, 'base.html')
+
+    def test_fragment_for_unknown_post(self):
+        response = self.client.get(
+            reverse('post_comments', args=['other', self.post.pk]))
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(POSTS_COMMENTS_PER_PAGE=3)
+class TestCommentCache(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create(username='author')
+        self.post = Post.objects.create(text='text', author=self.author)
+        self.url = reverse('post', args=['author', self.post.pk])
+        self.client.force_login(self.author)
+
+    def get(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        texts = [comment.text for comment in response.context['comment_page']]
+        return texts, len(queries)
+
+    def comment(self, text):
+        self.client.post(self.url, {'text': text})
+
+    def test_new_comments_are_written_through(self):
+        self.comment('first')
+        texts, cold = self.get()
+        self.assertEqual(texts, ['first'])
+        self.comment('second')
+        texts, warm = self.get()
+        self.assertEqual(texts, ['first', 'second'])
+        # сессия, пользователь, пост — без запроса за комментариями
+        self.assertEqual(warm, cold - 1)
+
+    def test_full_page_is_not_touched(self):
+        for i in range(4):
+            self.comment(f'comment {i}')
+        self.get()
+        for i in range(4, 10):
+            self.comment(f'comment {i}')
+        texts, queries = self.get()
+        self.assertEqual(texts, ['comment 0', 'comment 1', 'comment 2'])
+        self.assertEqual(queries, 3)
+
+    def test_lost_append_is_refetched(self):
+        self.comment('first')
+        self.get()
+        with mock.patch('posts.comment_cache.append'):
+            self.comment('second')
+        self.assertEqual(self.get()[0], ['first', 'second'])
+
+    def test_delete_invalidates(self):
+        self.comment('first')
+        self.comment('second')
+        self.get()
+        Comment.objects.get(text='first').delete()
+        self.assertEqual(self.get()[0], ['second'])
+
+
+class TestCommentBuffer(TestCase):
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        overridden = override_settings(POSTS_COMMENT_BUFFER=True,
+                                       POSTS_COMMENT_BUFFER_DIR=self.directory,
+                                       POSTS_COMMENT_BUFFER_FSYNC=False)
+        overridden.enable()
+        self.addCleanup(overridden.disable)
+        self.author = User.objects.create(username='author')
+        self.user = User.objects.create(username='user')
+        self.post = Post.objects.create(text='text', author=self.author)
+        self.url = reverse('post', args=['author', self.post.pk])
+        self.client.force_login(self.user)
+
+    def test_comment_is_buffered_and_shown_to_author(self):
+        etag = self.client.get(self.url)['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, {'text': 'buffered'})
+        self.assertRedirects(response, self.url)
+        self.assertFalse(any(query['sql'].startswith('INSERT')
+                             for query in queries))
+        self.assertFalse(Comment.objects.exists())
+
+        response = self.client.get(self.url)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertContains(response, 'buffered')
+        self.assertContains(response, 'Публикуется')
+        self.assertNotContains(Client().get(self.url), 'buffered')
+
+    def test_flush(self):
+        self.client.post(reverse('add_comment', args=['author', self.post.pk]),
+                         {'text': 'first'})
+        self.client.post(self.url, {'text': 'second'})
+        out = StringIO()
+        call_command('flush_comment_buffer', stdout=out)
+        self.assertIn('Перенесено комментариев: 2', out.getvalue())
+
+        self.assertEqual(list(Comment.objects.order_by('created')
+                              .values_list('text', flat=True)),
+                         ['first', 'second'])
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 2)
+        response = self.client.get(self.url)
+        self.assertEqual(response.content.decode().count('second'), 1)
+        self.assertNotContains(response, 'Публикуется')
+
+    def test_flush_is_idempotent(self):
+        record = comment_buffer.submit(self.post.pk, self.user, 'once')
+        comment_buffer.flush()
+        # сброс упал после вставки и не успел удалить файл
+        path = os.path.join(self.directory, comment_buffer.FLUSHING.format(1))
+        with open(path, 'w') as file:
+            file.write(json.dumps(record) + '\n{"broken\n')
+        with self.assertLogs('posts.comment_buffer', 'WARNING'):
+            self.assertEqual(comment_buffer.flush(), 1)
+        self.assertEqual(Comment.objects.filter(text='once').count(), 1)
+        self.assertFalse(os.listdir(self.directory))
+
+
+@override_settings(POSTS_TIMELINE=True)
+class TestTasks(TestCase):
+    def setUp(self):
+        task_calls.clear()
+        self.user = User.objects.create(username='user')
+
+    def test_runs_once_per_key(self):
+        first = tasks.enqueue(record_task, 'ok', key='record:ok')
+        second = tasks.enqueue(record_task, 'ok', key='record:ok')
+        tasks.enqueue(record_task, 'other')
+        self.assertEqual(first.pk, second.pk)
+        self.assertEqual(task_calls, ['ok', 'other'])
+        self.assertEqual(Task.objects.filter(status=Task.DONE).count(), 2)
+
+    def test_retry_with_backoff(self):
+        with self.assertLogs('posts.tasks', 'ERROR'):
+            queued = tasks.enqueue(record_task, 'fail')
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts),
+                         (Task.PENDING, 1))
+        self.assertIn('ValueError', queued.last_error)
+        self.assertGreater(queued.run_at, queued.created)
+        # повтору ещё рано
+        self.assertEqual(tasks.run_due(), 0)
+
+        Task.objects.update(run_at=queued.created)
+        with self.assertLogs('posts.tasks', 'ERROR'):
+            call_command('run_tasks', stdout=StringIO())
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), (Task.FAILED, 2))
+        self.assertEqual(task_calls, ['fail', 'fail'])
+
+    def test_expired_lease_is_taken_over(self):
+        now = timezone.now()
+        queued = Task.objects.create(
+            name='posts.tests.record_task', args='["lost"]',
+            status=Task.RUNNING, attempts=1,
+            locked_until=now + timedelta(minutes=1))
+        self.assertIsNone(tasks.run(queued.pk))
+        Task.objects.update(locked_until=now - timedelta(minutes=1))
+        out = StringIO()
+        call_command('run_tasks', stdout=out)
+        self.assertIn('Выполнено задач: 1', out.getvalue())
+        self.assertEqual(task_calls, ['lost'])
+
+    def test_failed_key_can_be_enqueued_again(self):
+        with self.assertLogs('posts.tasks', 'ERROR'):
+            queued = tasks.enqueue(record_task, 'fail', key='record:again')
+            Task.objects.update(run_at=timezone.now())
+            tasks.run_due()
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, Task.FAILED)
+
+        again = tasks.enqueue(record_task, 'ok', key='record:again')
+        again.refresh_from_db()
+        self.assertEqual((again.pk, again.status, again.attempts),
+                         (queued.pk, Task.DONE, 1))
+        self.assertEqual(task_calls, ['fail', 'fail', 'ok'])
+
+    def test_missing_thumbnail_source_retried(self):
+        with self.assertLogs('posts.tasks', 'ERROR'):
+            thumbnails.schedule(Post(image='posts/missing.png'))
+        queued = Task.objects.get(key='thumbnails:posts/missing.png')
+        self.assertEqual((queued.status, queued.attempts), (Task.PENDING, 1))
+        self.assertIn('не создана', queued.last_error)
+
+    def test_purge_done(self):
+        tasks.enqueue(record_task, 'old', key='record:old')
+        Task.objects.update(run_at=timezone.now() - timedelta(days=8))
+        self.assertEqual(tasks.purge(7), 1)
+        tasks.enqueue(record_task, 'old', key='record:old')
+        self.assertEqual(task_calls, ['old', 'old'])
+
+    def test_post_side_effects_are_tasks(self):
+        follower = User.objects.create(username='follower')
+        Follow.objects.create(user=follower, author=self.user)
+        client = Client()
+        client.force_login(self.user)
+        buffer = BytesIO()
+        Image.new('RGB', (60, 30), color='red').save(buffer, 'PNG')
+        client.post(reverse('new_post'), {
+            'text': 'with image',
+            'image': SimpleUploadedFile('task.png', buffer.getvalue()),
+        })
+        post = Post.objects.get(text='with image')
+        self.assertEqual(
+            set(Task.objects.values_list('key', 'status')),
+            {(f'thumbnails:{post.image.name}', Task.DONE),
+             (f'timeline:{post.pk}', Task.DONE)})
+        self.assertTrue(thumbnails.is_ready(post.image))
+        self.assertTrue(TimelineEntry.objects.filter(user=follower,
+                                                     post=post).exists())
+
+    @override_settings(POSTS_TASKS_EAGER=False)
+    def test_run_after_commit(self):
+        with mock.patch('posts.tasks.executor') as executor, \
+                mock.patch('django.db.transaction.on_commit') as on_commit:
+            queued = tasks.enqueue(record_task, 'later')
+            executor().submit.assert_not_called()
+            on_commit.call_args[0][0]()
+        self.assertEqual(task_calls, [])
+        executor().submit.assert_called_once_with(tasks._run_in_thread,
+                                                  queued.pk)
+
+
+class TestImageIngest(TestCase):
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        override = override_settings(MEDIA_ROOT=self.media.name,
+                                     POSTS_IMAGE_MAX_SIDE=100)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.user = User.objects.create(username='user')
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def upload(self, name, image, fmt, **options):
+        buffer = BytesIO()
+        image.save(buffer, fmt, **options)
+        return SimpleUploadedFile(name, buffer.getvalue())
+
+    def camera_jpeg(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6  # повёрнут на 90°
+        exif[0x0110] = 'Camera'
+        return self.upload('photo.jpeg', Image.new('RGB', (400, 200), 'red'),
+                           'JPEG', exif=exif.tobytes(), quality=100)
+
+    def post_image(self, upload):
+        self.client.post(reverse('new_post'),
+                         {'text': 'image', 'image': upload})
+        post = Post.objects.get(text='image')
+        return post.image, Image.open(post.image.path)
+
+    def test_resized_and_stripped(self):
+        field, stored = self.post_image(self.camera_jpeg())
+        self.assertTrue(field.name.endswith('photo.jpg'))
+        self.assertEqual(stored.format, 'JPEG')
+        # поворот применён к пикселям, длинная сторона ужата
+        self.assertEqual(stored.size, (50, 100))
+        self.assertNotIn('exif', stored.info)
+
+    @skipUnless(images.features.check('webp'), 'Pillow без WebP')
+    @override_settings(POSTS_IMAGE_FORMAT='webp', POSTS_IMAGE_QUALITY=60)
+    def test_webp(self):
+        field, stored = self.post_image(self.camera_jpeg())
+        self.assertTrue(field.name.endswith('photo.webp'))
+        self.assertEqual((stored.format, stored.size), ('WEBP', (50, 100)))
+
+    @override_settings(POSTS_IMAGE_FORMAT='JPEG')
+    def test_transparency_flattened(self):
+        image = Image.new('RGBA', (20, 20), (0, 0, 0, 0))
+        field, stored = self.post_image(self.upload('logo.png', image, 'PNG'))
+        self.assertTrue(field.name.endswith('logo.jpg'))
+        self.assertEqual(stored.convert('RGB').getpixel((0, 0)),
+                         (255, 255, 255))
+
+    def test_small_clean_image_kept(self):
+        upload = self.upload('red.png', Image.new('RGB', (60, 30), 'red'),
+                             'PNG', optimize=True)
+        self.assertIs(images.process(upload), upload)
+
+    def test_output_in_temporary_file(self):
+        upload = self.camera_jpeg()
+        processed = images.process(upload)
+        self.assertLess(processed.size, upload.size)
+        self.assertEqual(len(processed.read()), processed.size)
+        processed.file.fileno()
+        processed.close()
+
+    def test_truncated_image(self):
+        upload = self.camera_jpeg()
+        data = upload.read()
+        form = PostForm({'text': 'image'}, files={
+            'image': SimpleUploadedFile('cut.jpg', data[:len(data) // 2])})
+        self.assertFalse(form.is_valid())
+        self.assertIn('файл повреждён', form.errors['image'][0])
+
+    @override_settings(POSTS_IMAGE_MAX_PIXELS=100)
+    def test_too_many_pixels(self):
+        form = PostForm({'text': 'image'}, files={
+            'image': self.upload('big.png', Image.new('RGB', (20, 20)),
+                                 'PNG')})
+        self.assertFalse(form.is_valid())
+        self.assertIn('Слишком большая картинка', form.errors['image'][0])
+
+
+class TestReservedRoutes(TestCase):
+    def test_site_routes_do_not_shadow_profiles(self):
+        for username in ('export', 'metrics'):
+            with self.subTest(username=username):
+                self.assertEqual(resolve(f'/{username}/').url_name,
+                                 'profile')
+                self.assertEqual(resolve(f'/{username}/follow/').url_name,
+                                 'profile_follow')
+                self.assertEqual(resolve(f'/{username}/unfollow/').url_name,
+                                 'profile_unfollow')
+        self.assertEqual(resolve('/staff/export/follows/').url_name,
+                         'export')
+        self.assertEqual(resolve('/staff/metrics/').url_name, 'metrics')
+
+    def test_signup_rejects_route_names(self):
+        self.assertTrue({'new', 'search', 'staff', 'group', 'media'}
+                        <= reserved_usernames())
+        for username, valid in (('search', False), ('Staff', False),
+                                ('searcher', True)):
+            with self.subTest(username=username):
+                form = CreationForm({'username': username,
+                                     'password1': 'Zx7-long-pass',
+                                     'password2': 'Zx7-long-pass'})
+                self.assertEqual(form.is_valid(), valid, form.errors)
@@ -0,0 +1,97 @@
+import logging
+
+from django.utils import timezone
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile
+
+from . import feed_cache, tasks
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+# Все производные картинок, которые показывают шаблоны.
+SIZES = [
+    ('960x339', {'crop': 'center', 'upscale': True}),
+]
+
+
+def _options(source, options):
+    backend = default.backend
+    options = dict(options)
+    if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(thumbnail_settings, attr)
+        if value != getattr(default_settings, attr):
+            options.setdefault(key, value)
+    return options
+
+
+def _thumbnail_file(file_, geometry, options):
+    source = ImageFile(file_)
+    options = _options(source, options)
+    name = default.backend._get_thumbnail_filename(source, geometry, options)
+    return ImageFile(name, default.storage)
+
+
+def lookup(file_, geometry, **options):
+    """Как sorl get_thumbnail(), но только ищет готовую миниатюру в
+    хранилище ключей и никогда не создаёт её."""
+    if not file_:
+        return None
+    return default.kvstore.get(_thumbnail_file(file_, geometry, options))
+
+
+def _discard(name, geometry, options):
+    # get_thumbnail отдаёт запись из хранилища ключей, а если её нет —
+    # не перезаписывает уже лежащий файл; убираем и то, и другое
+    thumbnail = _thumbnail_file(name, geometry, options)
+    default.kvstore.delete(thumbnail, delete_thumbnails=False)
+    if thumbnail.exists():
+        thumbnail.delete()
+
+
+def is_ready(file_):
+    return all(lookup(file_, geometry, **options)
+               for geometry, options in SIZES)
+
+
+def _touch(name):
+    # карточки и ленты с заглушкой вместо миниатюры пора перерисовать
+    posts = Post.objects.filter(image=name)
+    scopes = set()
+    for author_id, group_id in posts.values_list('author_id', 'group_id'):
+        scopes.update(feed_cache.post_scopes(author_id, group_id))
+    posts.update(updated=timezone.now())
+    feed_cache.bump(*scopes)
+
+
+@tasks.task(max_attempts=3)
+def create(name, force=False):
+    for geometry, options in SIZES:
+        if force:
+            _discard(name, geometry, options)
+        thumbnail = get_thumbnail(name, geometry, **options)
+        # sorl глотает ошибку чтения исходника и отдаёт незаписанный файл
+        if not thumbnail.exists():
+            raise OSError(f'Миниатюра {geometry} для {name} не создана')
+    _touch(name)
+
+
+def generate(name, force=False):
+    try:
+        create(name, force)
+        return True
+    except Exception:
+        logger.exception('Не удалось создать миниатюры для %s', name)
+        return False
+
+
+def schedule(post):
+    if post.image:
+        name = post.image.name
+        tasks.enqueue(create, name, key=f'thumbnails:{name}')
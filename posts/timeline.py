@@ -0,0 +1,149 @@
+"""Материализованная лента подписок (POSTS_TIMELINE).
+
+Новый пост раскладывается по лентам подписчиков автора (fan_out), и
+follow_index читает страницу из TimelineEntry по индексу
+(user, -pub_date, -post) без сортировки всей ленты. Посты авторов, у
+которых подписчиков больше POSTS_TIMELINE_FANOUT_LIMIT, не копируются:
+если пользователь подписан хотя бы на одного такого автора, его лента
+собирается из таблицы постов при запросе. Когда автор опускается до
+порога, его посты докладываются всем подписчикам (backfill_followers),
+иначе посты, написанные им в статусе знаменитости, пропали бы из лент.
+"""
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import Exists, F, OuterRef
+
+from users.models import Profile
+from . import tasks
+from .models import Follow, Post, TimelineEntry
+
+BATCH_SIZE = 1000
+# порядок страницы ленты: аннотации posts_for
+ORDERING = ('-feed_date', '-feed_post')
+
+
+def enabled():
+    return settings.POSTS_TIMELINE
+
+
+def is_celebrity(author_id):
+    return Profile.objects.filter(
+        user_id=author_id,
+        followers_count__gt=settings.POSTS_TIMELINE_FANOUT_LIMIT
+    ).exists()
+
+
+def _insert(rows):
+    """rows — кортежи (user_id, post_id, pub_date)."""
+    rows = iter(rows)
+    while True:
+        entries = [TimelineEntry(user_id=user_id, post_id=post_id,
+                                 pub_date=pub_date)
+                   for user_id, post_id, pub_date
+                   in islice(rows, BATCH_SIZE)]
+        if not entries:
+            return
+        TimelineEntry.objects.bulk_create(entries, ignore_conflicts=True)
+
+
+@tasks.task()
+def fan_out(post_id, author_id):
+    """Раскладывает новый пост по лентам подписчиков автора. Посты авторов
+    с огромным числом подписчиков не копируются, а читаются при запросе.
+    Выполняется фоновой задачей (schedule_fan_out)."""
+    if not enabled() or is_celebrity(author_id):
+        return
+    pub_date = Post.objects.filter(pk=post_id).values_list(
+        'pub_date', flat=True).first()
+    if pub_date is None:
+        return
+    followers = Follow.objects.filter(author_id=author_id).values_list(
+        'user_id', flat=True)
+    _insert((user_id, post_id, pub_date)
+            for user_id in followers.iterator())
+
+
+def schedule_fan_out(post):
+    if enabled():
+        tasks.enqueue(fan_out, post.pk, post.author_id,
+                      key=f'timeline:{post.pk}')
+
+
+def backfill(user_id, author_id):
+    if not enabled() or is_celebrity(author_id):
+        return
+    posts = Post.objects.filter(author_id=author_id).values_list(
+        'pk', 'pub_date')
+    _insert((user_id, post_id, pub_date)
+            for post_id, pub_date in posts.iterator())
+
+
+@tasks.task()
+def backfill_followers(author_id):
+    """Докладывает посты автора всем его подписчикам."""
+    followers = Follow.objects.filter(author_id=author_id).values_list(
+        'user_id', flat=True)
+    for user_id in followers.iterator():
+        backfill(user_id, author_id)
+
+
+def follower_lost(author_id):
+    """Вызывается после отписки, когда счётчик подписчиков уже уменьшен:
+    автор, только что опустившийся до порога, снова раскладывается."""
+    if enabled() and Profile.objects.filter(
+            user_id=author_id,
+            followers_count=settings.POSTS_TIMELINE_FANOUT_LIMIT).exists():
+        tasks.enqueue(backfill_followers, author_id)
+
+
+def remove(user_id, author_id):
+    if not enabled():
+        return
+    TimelineEntry.objects.filter(user_id=user_id,
+                                 post__author_id=author_id).delete()
+
+
+def rebuild(users=None):
+    entries = TimelineEntry.objects.all()
+    follows = Follow.objects.all()
+    if users is not None:
+        entries = entries.filter(user__in=users)
+        follows = follows.filter(user__in=users)
+    entries.delete()
+    for user_id, author_id in follows.values_list('user_id', 'author_id') \
+            .iterator():
+        backfill(user_id, author_id)
+
+
+def follows_celebrity(user):
+    return Follow.objects.filter(
+        user=user,
+        author__profile__followers_count__gt=(
+            settings.POSTS_TIMELINE_FANOUT_LIMIT)
+    ).exists()
+
+
+def posts_for(user):
+    """Посты ленты подписок в порядке ORDERING."""
+    posts = Post.objects.for_feed()
+    if enabled() and not follows_celebrity(user):
+        posts = posts.filter(timeline_entries__user=user).annotate(
+            feed_date=F('timeline_entries__pub_date'),
+            feed_post=F('timeline_entries__post'),
+        )
+    else:
+        # Соединение с Follow дало бы SQLite выбрать индекс автора и
+        # сортировать все посты подписок во временном B-дереве. С EXISTS
+        # посты читаются по post_pub_date_idx в порядке ленты, а подписка
+        # проверяется по уникальному индексу (user, author), пока не
+        # наберётся страница. Цена — число просмотренных постов: у того,
+        # кто подписан лишь на молчащих авторов, это вся таблица, но без
+        # сортировки.
+        posts = posts.annotate(
+            followed=Exists(Follow.objects.filter(user=user,
+                                                  author=OuterRef('author'))),
+            feed_date=F('pub_date'),
+            feed_post=F('id'),
+        ).filter(followed=True)
+    return posts.order_by(*ORDERING)
@@ -8,6 +8,8 @@ urlpatterns = [
     path("group/<slug:slug>/", views.group_posts, name="group_posts"),
     path("new/", views.new_post, name="new_post"),
     path("follow/", views.follow_index, name="follow_index"),
+    path("staff/export/<str:table>/", views.export, name="export"),
+    path("search/", views.search, name="search"),
     path('<str:username>/', views.profile, name='profile'),
     path("<str:username>/follow/", views.profile_follow, name="profile_follow"), 
     path("<str:username>/unfollow/", views.profile_unfollow, name="profile_unfollow"),
@@ -18,4 +20,5 @@ urlpatterns = [
         name='post_edit'
     ),
     path("<str:username>/<int:post_id>/comment/", views.add_comment, name="add_comment"),
+    path("<str:username>/<int:post_id>/comments/", views.post_comments, name="post_comments"),
 ]
@@ -1,33 +1,183 @@
 from django.http import request
+from django.http import Http404, HttpResponseBadRequest, StreamingHttpResponse
+from django.contrib.admin.views.decorators import staff_member_required
 from django.shortcuts import render, get_object_or_404, redirect
 from .models import Post, Group, Comment, Follow
 from .forms import PostForm, CommentForm
 from django.contrib.auth.decorators import login_required
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.core.paginator import Paginator
 from django.contrib.auth import get_user_model
+from django.conf import settings
+from django.db import transaction
+from django.views.decorators.http import condition
+from .paginator import CursorPaginator
+from yatube.metrics import query_budget
+from yatube.replicas import reading_from, replica_reads
+from . import (comment_buffer, comment_cache, feed_cache, ndjson, thumbnails,
+               timeline)
+from . import search as post_search
+from .gather import gather
 
 User = get_user_model()
 
 
+def make_paginator(post_list, ordering=('-pub_date', '-id')):
+    if settings.POSTS_PAGINATION == 'cursor':
+        return CursorPaginator(post_list,
+                               settings.POSTS_PER_PAGE,
+                               ordering=ordering,
+                               with_count=settings.POSTS_PAGINATION_COUNT)
+    return Paginator(post_list, settings.POSTS_PER_PAGE)
+
+
+def paginate(request, post_list, ordering=('-pub_date', '-id')):
+    paginator = make_paginator(post_list, ordering)
+    if isinstance(paginator, CursorPaginator):
+        return paginator, paginator.get_page(request.GET.get('cursor'))
+    return paginator, paginator.get_page(request.GET.get('page'))
+
+
+def page_key(request, paginator, page=None):
+    """Страница для ключа кэша ленты: номер выбранной страницы или курсор
+    в каноническом виде. Строка запроса как есть в ключ не попадает,
+    иначе каждый ?page=<мусор> заводил бы в кэше новую запись. Функции
+    ETag страница ещё не выбрана: номер только приводится к числу, без
+    запросов к базе."""
+    if isinstance(paginator, CursorPaginator):
+        return paginator.cursor_key(request.GET.get('cursor')) or '1'
+    if page is not None:
+        return str(page.number)
+    try:
+        return str(int(request.GET.get('page') or 1))
+    except ValueError:
+        return '1'
+
+
+def feed_etag(request, scope, post_list):
+    return feed_cache.fragment_key(
+        request, scope, page_key(request, make_paginator(post_list)))
+
+
+def feed_key(request, scope, paginator, page):
+    return feed_cache.fragment_key(request, scope,
+                                   page_key(request, paginator, page))
+
+
+def lookup(request, queryset, **filters):
+    """Объект страницы выбирается один раз за запрос: его делят
+    функция ETag и само представление."""
+    found = request.__dict__.setdefault('_lookups', {})
+    key = (queryset.model, tuple(sorted(filters.items())))
+    if key not in found:
+        found[key] = queryset.filter(**filters).first()
+    return found[key]
+
+
+def lookup_or_404(request, queryset, **filters):
+    obj = lookup(request, queryset, **filters)
+    if obj is None:
+        raise Http404
+    return obj
+
+
+def post_queryset():
+    return Post.objects.for_feed().select_related('author__profile')
+
+
+def post_comments_queryset(post):
+    return post.comment.select_related('author')
+
+
+def save_comment(request, post_id, form):
+    """Сохраняет комментарий сразу или, с POSTS_COMMENT_BUFFER, через
+    буфер отложенной записи."""
+    if comment_buffer.enabled():
+        comment_buffer.submit(post_id, request.user,
+                              form.cleaned_data['text'])
+        return
+    comment = form.save(commit=False)
+    comment.author = request.user
+    comment.post_id = post_id
+    comment.save()
+
+
+def comment_paginator(comments):
+    return CursorPaginator(comments, settings.POSTS_COMMENTS_PER_PAGE,
+                           ordering=comment_cache.ORDERING,
+                           with_count=False)
+
+
+def comment_page(request, post, comments):
+    """Комментарии по порядку, не больше POSTS_COMMENTS_PER_PAGE за раз:
+    у популярного поста их тысячи. Первая страница берётся из кэша."""
+    paginator = comment_paginator(comments)
+    cursor = request.GET.get('cursor')
+    if not cursor:
+        return paginator.first_page(comment_cache.head(post, comments))
+    return paginator.get_page(cursor)
+
+
+def index_etag(request):
+    return feed_etag(request, feed_cache.index_scope(),
+                     Post.objects.for_feed())
+
+
+def group_etag(request, slug):
+    group = lookup(request, Group.objects.all(), slug=slug)
+    if group is not None:
+        return feed_etag(request, feed_cache.group_scope(group.pk),
+                         group.group_posts.for_feed())
+
+
+def profile_etag(request, username):
+    # автора может ещё не быть на реплике
+    with reading_from(None):
+        author = lookup(request, User.objects.select_related('profile'),
+                        username=username)
+    if author is not None:
+        return feed_etag(request, feed_cache.profile_scope(author.pk),
+                         author.author_posts.for_feed())
+
+
+def post_etag(request, username, post_id):
+    post = lookup(request, post_queryset(), id=post_id,
+                  author__username=username)
+    if post is not None:
+        # страница комментариев, а не ленты автора
+        comments = comment_paginator(post_comments_queryset(post))
+        profile_key = feed_cache.fragment_key(
+            request, feed_cache.profile_scope(post.author_id),
+            page_key(request, comments))
+        etag = f'{profile_key}:{post.updated.timestamp()}:{post.comment_count}'
+        if comment_buffer.enabled():
+            etag += ':' + comment_buffer.overlay_version(request.user, post.pk)
+        return etag
+
+
+@query_budget(6)
+@replica_reads
+@condition(etag_func=index_etag)
 def index(request):
-    post_list = Post.objects.all()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    post_list = Post.objects.for_feed()
+    paginator, page = paginate(request, post_list)
     return render(
         request,
         'index.html',
-        {'page': page, 'paginator': paginator, }
+        {'page': page, 'paginator': paginator,
+         'feed_key': feed_key(request, feed_cache.index_scope(),
+                              paginator, page),
+         'feed_timeout': settings.POSTS_FEED_CACHE_TIMEOUT, }
     )
 
 
+@query_budget(7)
+@replica_reads
+@condition(etag_func=group_etag)
 def group_posts(request, slug):
-    group = get_object_or_404(Group, slug=slug)
-    posts = group.group_posts.all()
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    group = lookup_or_404(request, Group.objects.all(), slug=slug)
+    posts = group.group_posts.for_feed()
+    paginator, page = paginate(request, posts)
     return render(request,
                   "group.html",
                   {
@@ -35,29 +185,46 @@ def group_posts(request, slug):
                       "posts": posts,
                       "page": page,
                       'paginator': paginator,
+                      'feed_key': feed_key(
+                          request, feed_cache.group_scope(group.pk),
+                          paginator, page),
+                      'feed_timeout': settings.POSTS_FEED_CACHE_TIMEOUT,
                   }
                   )
 
 
+@query_budget(18)
 @login_required
 def new_post(request):
     form = PostForm(request.POST or None, files=request.FILES or None)
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
-        post.save()
+        # пост и его фоновые задачи записываются вместе
+        with transaction.atomic():
+            post.save()
+            thumbnails.schedule(post)
         return redirect("index")
     return render(request, "new_post.html", {"form": form})
 
 
+@query_budget(8)
+@replica_reads
+@condition(etag_func=profile_etag)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    post_list = author.author_posts.all()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
-    is_following = (request.user.is_authenticated and 
-                   Follow.objects.filter(user=request.user, author=author).exists())
+    author = lookup_or_404(request, User.objects.select_related('profile'),
+                           username=username)
+    post_list = author.author_posts.for_feed()
+
+    def following():
+        return Follow.objects.filter(user=request.user, author=author).exists()
+
+    # пользователь сессии загружается здесь, а не в потоке пула
+    if request.user.is_authenticated:
+        (paginator, page), is_following = gather(
+            lambda: paginate(request, post_list), following)
+    else:
+        (paginator, page), is_following = paginate(request, post_list), False
     return render(request,
                   'profile.html',
                   {
@@ -66,52 +233,80 @@ def profile(request, username):
                       'paginator': paginator,
                       'post_list': post_list,
                       'is_following': is_following,
+                      'feed_key': feed_key(
+                          request, feed_cache.profile_scope(author.pk),
+                          paginator, page),
+                      'feed_timeout': settings.POSTS_FEED_CACHE_TIMEOUT,
                   }
                   )
 
 
+@query_budget(6)
+@replica_reads
+@condition(etag_func=post_etag)
 def post_view(request, username, post_id):
     #author = get_object_or_404(User, username=username)
-    post = get_object_or_404(Post, id=post_id, author__username=username)
+    post = lookup_or_404(request, post_queryset(), id=post_id,
+                         author__username=username)
     form = CommentForm(request.POST or None)
     if form.is_valid():
-        comment = form.save(commit=False)
-        comment.author = request.user
-        comment.post_id = post_id
-        comment.save()
+        save_comment(request, post_id, form)
         return redirect('post', username=username, post_id=post_id)
+    comments = post_comments_queryset(post)
     return render(request,
                   'post.html',
                   {
                       'author': post.author,
                       'post': post,
                       'form': form,
+                      'comments': comments,
+                      'comment_page': comment_page(request, post, comments),
+                      'pending_comments': (
+                          comment_buffer.pending_for(request.user, post.pk)
+                          if comment_buffer.enabled() else []),
                   }
                   )
 
 
+@query_budget(3)
+@replica_reads
+def post_comments(request, username, post_id):
+    """Следующая страница комментариев фрагментом HTML для «Показать ещё»."""
+    post = get_object_or_404(Post.objects.only('id', 'comment_count'),
+                             id=post_id,
+                             author__username=username)
+    comments = post_comments_queryset(post)
+    return render(request, 'includes/comment_list.html', {
+        'post_url': reverse('post', args=[username, post_id]),
+        'fragment_url': request.path,
+        'comment_page': comment_page(request, post, comments),
+    })
+
+
+@query_budget(8)
 @login_required
 def add_comment(request, username, post_id):
     post = get_object_or_404(Post, pk=post_id, author__username=username)
     form = CommentForm(request.POST or None)
     if form.is_valid():
-        comment = form.save(commit=False)
-        comment.author = request.user
-        comment.post_id = post_id
-        comment.save()
+        save_comment(request, post_id, form)
         return redirect('post', username=username, post_id=post_id)
     return render(request, 'comments.html', {'form': form})
 
 
+@query_budget(16)
 @login_required
 def post_edit(request, username, post_id):
     post = get_object_or_404(Post, id=post_id, author__username=username)
     if request.user != post.author:
-        return redirect('post', usermame=username, post_id=post_id)
+        return redirect('post', username=username, post_id=post_id)
     form = PostForm(request.POST or None,
                     files=request.FILES or None, instance=post)
     if form.is_valid():
-        form.save()
+        with transaction.atomic():
+            post = form.save()
+            if 'image' in form.changed_data:
+                thumbnails.schedule(post)
         return redirect('post', username=username, post_id=post_id)
     return render(request,
                   'new_post.html',
@@ -136,12 +331,12 @@ def page_not_found(request, exception):
 def server_error(request):
     return render(request, "misc/500.html", status=500)
 
+@query_budget(6)
 @login_required
+@replica_reads
 def follow_index(request):
-    post_list = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    post_list = timeline.posts_for(request.user)
+    paginator, page = paginate(request, post_list, timeline.ORDERING)
     return render(request,
                   'follow.html',
                   {
@@ -152,16 +347,33 @@ def follow_index(request):
                   )
 
 
+@query_budget(7)
+@replica_reads
+def search(request):
+    query = request.GET.get('q', '').strip()
+    results = post_search.backend().search(query)
+    paginator = Paginator(results, settings.POSTS_PER_PAGE)
+    page = paginator.get_page(request.GET.get('page'))
+    return render(request,
+                  'search.html',
+                  {
+                    'query': query,
+                    'page': page,
+                    'paginator': paginator,
+                  }
+                  )
+
+
+@query_budget(14)
 @login_required
 def profile_follow(request, username):
     to_follow = get_object_or_404(User, username=username)
-    if (to_follow == request.user or 
-        Follow.objects.filter(user=request.user, author=to_follow).exists()):
-        return redirect('profile', username=username)
-    Follow.objects.create(user=request.user, author=to_follow)
+    if to_follow != request.user:
+        Follow.objects.get_or_create(user=request.user, author=to_follow)
     return redirect('profile', username=username)
 
 
+@query_budget(12)
 @login_required
 def profile_unfollow(request, username):
     main_user = request.user
@@ -170,3 +382,25 @@ def profile_unfollow(request, username):
     if following.exists():
         following.delete()
     return redirect('profile', username=username)
+
+
+@staff_member_required
+def export(request, table):
+    try:
+        rows = ndjson.rows(table,
+                           author=request.GET.get('author'),
+                           group=request.GET.get('group'),
+                           since=request.GET.get('since'),
+                           until=request.GET.get('until'))
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    content = ndjson.buffered(ndjson.lines(rows))
+    compress = 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+    if compress:
+        content = ndjson.gzipped(content)
+    response = StreamingHttpResponse(content,
+                                     content_type='application/x-ndjson')
+    if compress:
+        response['Content-Encoding'] = 'gzip'
+    response['Content-Disposition'] = f'attachment; filename="{table}.ndjson"'
+    return response
@@ -1,4 +1,14 @@
+import pytest
+
+from yatube.test_runner import TEST_SETTINGS
+
 pytest_plugins = [
     'tests.fixtures.fixture_user',
     'tests.fixtures.fixture_data',
 ]
+
+
+@pytest.fixture(autouse=True)
+def test_settings(settings):
+    for name, value in TEST_SETTINGS.items():
+        setattr(settings, name, value)
@@ -1,12 +1,39 @@
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth import get_user_model
 from django import forms
+from django.conf import settings
+from django.urls import get_resolver
 
 
 User = get_user_model()
 
 
+def reserved_usernames():
+    """Первые части адресов сайта («new», «search», «staff», «media»…):
+    профиль пользователя с таким именем перекрыл бы их адрес /<имя>/."""
+    names = {url.strip('/').split('/')[0]
+             for url in (settings.MEDIA_URL, settings.STATIC_URL)}
+
+    def walk(patterns):
+        for pattern in patterns:
+            first = str(pattern.pattern).lstrip('^').split('/')[0]
+            if not first:
+                walk(getattr(pattern, 'url_patterns', []))
+            elif not any(char in first for char in '<(['):
+                # постоянный адрес, а не параметр или регулярное выражение
+                names.add(first)
+
+    walk(get_resolver().url_patterns)
+    return {name.lower() for name in names}
+
+
 class CreationForm(UserCreationForm):
     class Meta(UserCreationForm.Meta):
         model = User
         fields = ("first_name", "last_name", "username", "email")
+
+    def clean_username(self):
+        username = self.cleaned_data["username"]
+        if username.lower() in reserved_usernames():
+            raise forms.ValidationError("Это имя занято адресом сайта")
+        return username
@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_of(model, field):
+    counted = (model.objects.filter(**{field: OuterRef('user_id')})
+               .order_by()
+               .values(field)
+               .annotate(total=Count('pk'))
+               .values('total'))
+    return Coalesce(Subquery(counted, output_field=IntegerField()), 0)
+
+
+def fill_profiles(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Profile = apps.get_model('users', 'Profile')
+    Post = apps.get_model('posts', 'Post')
+    Follow = apps.get_model('posts', 'Follow')
+    Profile.objects.bulk_create(
+        (Profile(user_id=pk) for pk in
+         User.objects.filter(profile__isnull=True).values_list('pk', flat=True)),
+        batch_size=1000,
+    )
+    Profile.objects.update(
+        posts_count=count_of(Post, 'author'),
+        followers_count=count_of(Follow, 'author'),
+        following_count=count_of(Follow, 'user'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+        ('posts', '0010_post_comment_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_profiles, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,184 @@
+"""Учёт стоимости запросов по именам URL: число SQL-запросов, время в БД,
+время рендеринга шаблонов и размер ответа.
+
+Время шаблонов снимается обёрткой над render() шаблонов бэкенда Django:
+через неё проходят render() и render_to_string(), но не вложенные include,
+поэтому время не считается дважды. Обёртка ставится только на время
+обработки запроса в QueryMetricsMiddleware (templates_timed) и снимается,
+когда запросов в работе не остаётся.
+"""
+import contextlib
+import json
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.db import connections
+from django.http import JsonResponse
+from django.template.backends.django import Template
+
+logger = logging.getLogger('yatube.metrics')
+
+FIELDS = ('queries', 'db_time', 'template_time', 'total_time', 'size')
+SAMPLES_PER_VIEW = 1000
+
+_local = threading.local()
+_lock = threading.Lock()
+_samples = defaultdict(lambda: deque(maxlen=SAMPLES_PER_VIEW))
+
+_render = Template.render
+_render_lock = threading.Lock()
+_render_users = 0
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_budget(queries):
+    def decorator(view):
+        view.query_budget = queries
+        return view
+    return decorator
+
+
+def _timed_render(self, context=None, request=None):
+    sample = getattr(_local, 'sample', None)
+    if sample is None:
+        return _render(self, context, request)
+    started = time.perf_counter()
+    try:
+        return _render(self, context, request)
+    finally:
+        sample['template_time'] += time.perf_counter() - started
+
+
+@contextlib.contextmanager
+def templates_timed():
+    """Пока открыт хотя бы один такой контекст, render() шаблонов
+    засекается в sample своего потока; в остальное время Template не
+    тронут."""
+    global _render_users
+    with _render_lock:
+        if not _render_users:
+            Template.render = _timed_render
+        _render_users += 1
+    try:
+        yield
+    finally:
+        with _render_lock:
+            _render_users -= 1
+            if not _render_users:
+                Template.render = _render
+
+
+class Sample(dict):
+    def __init__(self, **fields):
+        super().__init__(**fields)
+        # запросы одного HTTP-запроса могут идти из нескольких потоков
+        self.lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self.lock:
+                self['queries'] += 1
+                self['db_time'] += elapsed
+
+
+def current_sample():
+    return getattr(_local, 'sample', None)
+
+
+@contextlib.contextmanager
+def counted_in(sample):
+    """Засчитывает SQL-запросы текущего потока в sample — в том числе
+    в потоках пула, которым запрос отдал часть работы."""
+    if sample is None:
+        yield
+        return
+    with contextlib.ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(sample))
+        yield
+
+
+class QueryMetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        sample = Sample(queries=0, db_time=0.0, template_time=0.0)
+        _local.sample = sample
+        started = time.perf_counter()
+        try:
+            with templates_timed(), counted_in(sample):
+                response = self.get_response(request)
+        finally:
+            _local.sample = None
+        sample['total_time'] = time.perf_counter() - started
+        sample['size'] = (0 if response.streaming
+                          else len(response.content))
+
+        match = getattr(request, 'resolver_match', None)
+        if match is None or not match.url_name:
+            return response
+        record(match.url_name, sample)
+        budget = getattr(match.func, 'query_budget', None)
+        if budget is not None and sample['queries'] > budget:
+            message = (f'{match.url_name}: {sample["queries"]} '
+                       f'SQL-запросов при бюджете {budget}')
+            if settings.QUERY_BUDGET_STRICT:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+
+def record(name, sample):
+    with _lock:
+        _samples[name].append(dict(sample))
+    path = settings.QUERY_METRICS_LOG
+    if path:
+        line = json.dumps(dict(sample, view=name))
+        with _lock, open(path, 'a') as log:
+            log.write(line + '\n')
+
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1,
+                max(0, round(percent / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(samples):
+    by_view = defaultdict(list)
+    for sample in samples:
+        by_view[sample['view']].append(sample)
+    report = {}
+    for view, rows in sorted(by_view.items()):
+        report[view] = {'requests': len(rows)}
+        for field in FIELDS:
+            values = [row[field] for row in rows]
+            report[view][field] = {
+                f'p{percent}': percentile(values, percent)
+                for percent in (50, 95, 99)
+            }
+    return report
+
+
+def collected():
+    with _lock:
+        return [dict(sample, view=name)
+                for name, rows in _samples.items() for sample in rows]
+
+
+@staff_member_required
+def metrics(request):
+    return JsonResponse(summarize(collected()))
@@ -0,0 +1,171 @@
+"""Чтение ленты и профилей с реплик.
+
+Реплики перечислены в настройке DATABASE_REPLICAS. На реплику уходят
+только запросы на чтение внутри view, обёрнутых replica_reads, и только
+для GET и HEAD; всё остальное, включая сессии, идёт в default.
+
+Реплика отстаёт от основной базы. Перед снятием копии в основную базу
+пишется строка ReplicaSync с текущим моментом (mark_synced; manage.py
+sync_replicas делает это сам, при другой репликации вызывайте его
+периодически), и каждая реплика читает момент своего снимка из себя
+самой. Реплика старше DATABASE_REPLICA_MAX_LAG или без этой строки не
+используется. После записи ответ ставит cookie с её моментом, и запросы
+этого пользователя читают только из реплик, снятых позже: свой новый
+пост или комментарий он видит сразу. Чужие изменения ленты кэш
+фрагментов учитывает сам: если поколение ленты моложе снимка реплики,
+запрос дочитывается из default.
+"""
+import contextlib
+import functools
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError
+
+COOKIE = 'wrote_at'
+# момент снимка реплики перечитывается не чаще раза в столько секунд
+CHECK_SECONDS = 1
+# сессии и кэш в таблице читаются только из основной базы
+PRIMARY_APPS = {'sessions', 'django_cache'}
+
+_local = threading.local()
+_synced = {}
+
+
+def replicas():
+    return settings.DATABASE_REPLICAS
+
+
+def mark_synced(moment=None):
+    """Записывает в основную базу moment (time.time()): копия, снятая
+    после этого, содержит все изменения до него."""
+    from posts.models import ReplicaSync
+
+    moment = time.time() if moment is None else moment
+    ReplicaSync.objects.using(DEFAULT_DB_ALIAS).update_or_create(
+        pk=1, defaults={'synced': moment})
+    _synced.clear()
+
+
+def synced_at(alias):
+    """Момент снимка реплики alias по строке ReplicaSync в ней самой."""
+    from posts.models import ReplicaSync
+
+    now = time.monotonic()
+    checked, moment = _synced.get(alias, (None, None))
+    if checked is None or now - checked >= CHECK_SECONDS:
+        try:
+            moment = ReplicaSync.objects.using(alias).values_list(
+                'synced', flat=True).first()
+        except DatabaseError:
+            # копия старше таблицы или её ещё нет
+            moment = None
+        _synced[alias] = (now, moment)
+    return moment
+
+
+def fresh_replicas(after=0):
+    """Реплики со снимком моложе DATABASE_REPLICA_MAX_LAG и позже after,
+    с моментами их снимков."""
+    max_lag = settings.DATABASE_REPLICA_MAX_LAG
+    now = time.time()
+    fresh = []
+    for alias in replicas():
+        synced = synced_at(alias)
+        if synced is not None and synced > after and now - synced < max_lag:
+            fresh.append((alias, synced))
+    return fresh
+
+
+def replica_reads(view):
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD') or not replicas():
+            return view(request, *args, **kwargs)
+        fresh = fresh_replicas(after=getattr(_local, 'wrote_at', 0))
+        if not fresh:
+            return view(request, *args, **kwargs)
+        # одна реплика на весь запрос, чтобы не смешивать разное отставание
+        _local.replica, _local.synced_at = random.choice(fresh)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _local.replica = _local.synced_at = None
+    return wrapper
+
+
+def current():
+    """Реплика, с которой читает текущий поток, или None."""
+    return getattr(_local, 'replica', None)
+
+
+@contextlib.contextmanager
+def reading_from(replica):
+    """Читать с той же реплики, что и запрос, в потоке пула; None —
+    из default."""
+    previous = current(), getattr(_local, 'synced_at', None)
+    _local.replica = replica
+    _local.synced_at = None
+    try:
+        yield
+    finally:
+        _local.replica, _local.synced_at = previous
+
+
+def primary_if_changed_since(moment):
+    """Дочитывает запрос из default, если данные менялись в момент
+    moment (time.time()) позже снимка реплики."""
+    replica = current()
+    if not replica:
+        return
+    synced = getattr(_local, 'synced_at', None)
+    if synced is None:
+        synced = synced_at(replica)
+    if synced is None or moment >= synced:
+        _local.replica = None
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replica = getattr(_local, 'replica', None)
+        if replica and model._meta.app_label not in PRIMARY_APPS:
+            return replica
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label not in PRIMARY_APPS:
+            _local.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # реплики — копии default, объекты из них можно связывать
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not replicas():
+            return self.get_response(request)
+        try:
+            _local.wrote_at = float(request.COOKIES.get(COOKIE, 0))
+        except ValueError:
+            _local.wrote_at = 0
+        _local.wrote = False
+        try:
+            response = self.get_response(request)
+            if _local.wrote:
+                response.set_cookie(
+                    COOKIE, str(time.time()),
+                    max_age=settings.DATABASE_REPLICA_MAX_LAG, httponly=True)
+        finally:
+            _local.wrote_at = 0
+            _local.wrote = False
+        return response
@@ -0,0 +1,16 @@
+"""Профиль настроек выбирается переменной окружения YATUBE_ENV:
+development (по умолчанию) или production."""
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .base import *  # noqa
+
+YATUBE_ENV = os.environ.get('YATUBE_ENV', 'development')
+
+if YATUBE_ENV == 'development':
+    from .development import *  # noqa
+elif YATUBE_ENV == 'production':
+    from .production import *  # noqa
+else:
+    raise ImproperlyConfigured(f'Неизвестный YATUBE_ENV: {YATUBE_ENV}')
@@ -0,0 +1,270 @@
+"""
+Django settings for yatube project: common part of the development and
+production profiles (see yatube/settings/__init__.py).
+
+Generated by 'django-admin startproject' using Django 2.2.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/2.2/topics/settings/
+
+For the full list of settings and their values, see
+https://docs.djangoproject.com/en/2.2/ref/settings/
+"""
+
+import os
+
+# Build paths inside the project like this: os.path.join(BASE_DIR, ...)
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))
+
+
+def env_list(name, default=''):
+    return [item.strip() for item in os.environ.get(name, default).split(',')
+            if item.strip()]
+
+
+# Quick-start development settings - unsuitable for production
+# See https://docs.djangoproject.com/en/2.2/howto/deployment/checklist/
+
+# SECURITY WARNING: keep the secret key used in production secret!
+SECRET_KEY = 'nq(n_3^s!f1eh22a0*&okuu%=o83uhy0mgocrflbd9^l@e8d76'
+
+# SECURITY WARNING: don't run with debug turned on in production!
+DEBUG = False
+
+ALLOWED_HOSTS = [
+    "localhost",
+    "127.0.0.1",
+    "[::1]",
+    "testserver",
+]
+
+# Application definition
+
+INSTALLED_APPS = [
+    'users',
+    'posts',
+    'django.contrib.sites',
+    'django.contrib.flatpages',
+    'django.contrib.admin',
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
+    'sorl.thumbnail',
+]
+
+MIDDLEWARE = [
+    'yatube.metrics.QueryMetricsMiddleware',
+    'django.middleware.security.SecurityMiddleware',
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'yatube.replicas.ReplicaMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+]
+
+ROOT_URLCONF = 'yatube.urls'
+TEMPLATES_DIR = os.path.join(BASE_DIR, "templates")
+TEMPLATES = [
+    {
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'DIRS': [TEMPLATES_DIR,],
+        'APP_DIRS': True,
+        'OPTIONS': {
+            'context_processors': [
+                'users.context_year.year',
+                'django.template.context_processors.debug',
+                'django.template.context_processors.request',
+                'django.contrib.auth.context_processors.auth',
+                'django.contrib.messages.context_processors.messages',
+            ],
+        },
+    },
+]
+
+WSGI_APPLICATION = 'yatube.wsgi.application'
+
+
+# Database
+# https://docs.djangoproject.com/en/2.2/ref/settings/#databases
+
+DATABASES = {
+    'default': {
+        # sqlite3 с PRAGMA для нескольких воркеров, см. yatube/sqlite/base.py
+        'ENGINE': 'yatube.sqlite',
+        'NAME': os.environ.get('YATUBE_DATABASE_NAME',
+                               os.path.join(BASE_DIR, 'db.sqlite3')),
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'pragmas': {
+                'journal_mode': 'wal',
+                'synchronous': 'normal',
+                'busy_timeout': 5000,
+                'cache_size': -64 * 1024,
+                'mmap_size': 256 * 1024 * 1024,
+            },
+        },
+    }
+}
+
+# Реплики только для чтения (копии default, например файлы, которые
+# обновляет manage.py sync_replicas): YATUBE_REPLICAS=/a.sqlite3,/b.sqlite3.
+# На них уходит чтение в лентах и профилях, см. yatube/replicas.py.
+DATABASE_REPLICAS = []
+for number, name in enumerate(env_list('YATUBE_REPLICAS'), start=1):
+    alias = f'replica{number}'
+    DATABASES[alias] = dict(
+        DATABASES['default'],
+        NAME=name,
+        # BEGIN IMMEDIATE берёт блокировку записи, а query_only её запрещает
+        OPTIONS=dict(DATABASES['default']['OPTIONS'], pragmas=dict(
+            DATABASES['default']['OPTIONS']['pragmas'], query_only=1),
+            transaction_mode='DEFERRED'),
+        TEST={'MIRROR': 'default'},
+    )
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['yatube.replicas.ReplicaRouter']
+# реплика, чей снимок старше стольких секунд, не используется; после
+# записи пользователь читает только из реплик, снятых позже неё
+DATABASE_REPLICA_MAX_LAG = 60 * 5
+
+
+# Password validation
+# https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
+
+AUTH_PASSWORD_VALIDATORS = [
+    {
+        'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.CommonPasswordValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator',
+    },
+]
+
+
+# Internationalization
+# https://docs.djangoproject.com/en/2.2/topics/i18n/
+
+LANGUAGE_CODE = 'ru'
+
+TIME_ZONE = 'UTC'
+
+USE_I18N = True
+
+USE_L10N = True
+
+USE_TZ = True
+
+
+# Static files (CSS, JavaScript, Images)
+# https://docs.djangoproject.com/en/2.2/howto/static-files/
+
+STATIC_URL = '/static/'
+STATIC_ROOT = os.path.join(BASE_DIR, "static")
+
+MEDIA_URL = '/media/'
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# загрузки больше мегабайта пишутся во временный файл, а не держатся в памяти
+FILE_UPLOAD_MAX_MEMORY_SIZE = 1024 * 1024
+
+LOGIN_URL = "/auth/login/"
+LOGIN_REDIRECT_URL = "index"
+LOGOUT_REDIRECT_URL = "index"
+
+EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
+EMAIL_FILE_PATH = os.path.join(BASE_DIR, "sent_emails")
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Кэш для поколений лент (posts/feed_cache.py): в production отдельный,
+# чтобы поток фрагментов не вытеснял поколения.
+POSTS_GENERATION_CACHE = 'default'
+# Сколько хранить отрисованные страницы лент и их поколения. Ключ
+# фрагмента меняется с поколением, срок лишь ограничивает число
+# устаревших копий.
+POSTS_FEED_CACHE_TIMEOUT = 60 * 60 * 24
+
+SITE_ID = 1
+
+TEST_RUNNER = 'yatube.test_runner.TestRunner'
+
+# Пагинация лент: "page" — номера страниц с COUNT(*) и OFFSET,
+# "cursor" — keyset-курсоры по (pub_date, id).
+POSTS_PAGINATION = "page"
+POSTS_PAGINATION_COUNT = True
+POSTS_PER_PAGE = 10
+# Комментариев на странице поста и в каждой подгрузке «Показать ещё».
+POSTS_COMMENTS_PER_PAGE = 20
+
+# Материализованная лента подписок (fan-out-on-write, posts/timeline.py).
+# Посты авторов, у которых подписчиков больше POSTS_TIMELINE_FANOUT_LIMIT,
+# не раскладываются: ленты их подписчиков читаются из таблицы постов.
+POSTS_TIMELINE = False
+POSTS_TIMELINE_FANOUT_LIMIT = 1000
+
+# Учёт SQL-запросов по представлениям. В строгом режиме превышение
+# бюджета @query_budget роняет запрос (и тесты), иначе пишется в лог.
+QUERY_BUDGET_STRICT = False
+QUERY_METRICS_LOG = None
+
+# Фоновые задачи (posts/tasks.py): миниатюры и раскладка постов по лентам.
+# POSTS_TASK_WORKERS потоков выполняют задачи сразу после коммита; 0 —
+# только manage.py run_tasks, который также повторяет упавшие задачи.
+POSTS_TASK_WORKERS = 2
+POSTS_TASK_MAX_ATTEMPTS = 5
+# пауза перед первым повтором, дальше она удваивается
+POSTS_TASK_RETRY_DELAY = 10
+# сколько задача закреплена за исполнителем, прежде чем её подберёт другой
+POSTS_TASK_LEASE = 60 * 5
+# Выполнять задачи сразу в enqueue(), в транзакции вызывающего. Включают
+# тесты (yatube/test_runner.py): их in-memory SQLite не видна пулу.
+POSTS_TASKS_EAGER = False
+
+# Потоки для независимых запросов одной страницы (posts/gather.py);
+# 0 — выполнять их по очереди в потоке запроса.
+POSTS_GATHER_WORKERS = 4
+
+# Картинки постов при загрузке (posts/images.py): длинная сторона
+# уменьшается до POSTS_IMAGE_MAX_SIDE, EXIF удаляется. Формат 'JPEG',
+# 'PNG', 'WEBP' или None — как у исходной картинки.
+POSTS_IMAGE_MAX_SIDE = 1920
+POSTS_IMAGE_FORMAT = None
+POSTS_IMAGE_QUALITY = 85
+# картинки больше этого числа пикселей отклоняются, не декодируя их
+POSTS_IMAGE_MAX_PIXELS = 50 * 1000 * 1000
+
+# Полнотекстовый поиск: posts.search.Fts5Backend (SQLite FTS5)
+# или posts.search.LikeBackend для других СУБД.
+POSTS_SEARCH_BACKEND = "posts.search.Fts5Backend"
+
+# Сколько хранить отрисованные карточки постов. Ключ карточки меняется
+# при правке поста и новом комментарии, так что срок нужен лишь для
+# вытеснения устаревших версий.
+POSTS_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Сколько хранить первую страницу комментариев поста (posts/comment_cache.py).
+POSTS_COMMENT_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Отложенная запись комментариев (posts/comment_buffer.py): запрос
+# дописывает комментарий в файл в POSTS_COMMENT_BUFFER_DIR, а
+# manage.py flush_comment_buffer --interval 1 переносит их в базу.
+POSTS_COMMENT_BUFFER = False
+POSTS_COMMENT_BUFFER_DIR = os.path.join(BASE_DIR, 'comment_buffer')
+POSTS_COMMENT_BUFFER_FSYNC = True
+# сколько автор видит свой комментарий, если сброс так и не случился
+POSTS_COMMENT_BUFFER_OVERLAY_TIMEOUT = 60 * 10
@@ -0,0 +1,63 @@
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .base import DATABASES, TEMPLATES, env_list
+
+
+DEBUG = False
+
+SECRET_KEY = os.environ.get('YATUBE_SECRET_KEY')
+if not SECRET_KEY:
+    raise ImproperlyConfigured('Задайте YATUBE_SECRET_KEY')
+
+ALLOWED_HOSTS = env_list('YATUBE_ALLOWED_HOSTS', 'localhost,127.0.0.1')
+
+# Соединение с БД живёт между запросами, а не открывается на каждый.
+DATABASES = {
+    alias: dict(database,
+                CONN_MAX_AGE=int(os.environ.get('YATUBE_CONN_MAX_AGE', 600)))
+    for alias, database in DATABASES.items()
+}
+
+# Скомпилированные шаблоны хранятся в памяти процесса.
+TEMPLATES = [
+    dict(TEMPLATES[0],
+         APP_DIRS=False,
+         OPTIONS=dict(TEMPLATES[0]['OPTIONS'], loaders=[
+             ('django.template.loaders.cached.Loader', [
+                 'django.template.loaders.filesystem.Loader',
+                 'django.template.loaders.app_directories.Loader',
+             ]),
+         ])),
+]
+
+# Кэш общий для всех процессов сервера: таблицы в БД (их создаёт
+# manage.py createcachetable). Файловый кэш не годится: в Django 2.2
+# каждая запись в нём перечитывает весь каталог, чтобы решить, пора ли
+# вытеснять. Фрагменты лент и карточки хранятся с TTL
+# (POSTS_FEED_CACHE_TIMEOUT, POSTS_CARD_CACHE_TIMEOUT), так что лимит
+# нужен лишь на случай всплеска: при переполнении удаляется каждый
+# CULL_FREQUENCY-й ключ.
+CACHE_OPTIONS = {
+    'MAX_ENTRIES': int(os.environ.get('YATUBE_CACHE_MAX_ENTRIES', 50000)),
+    'CULL_FREQUENCY': int(os.environ.get('YATUBE_CACHE_CULL_FREQUENCY', 3)),
+}
+# Поколения лент (posts/feed_cache.py) — по ключу на ленту — лежат в
+# отдельной таблице, чтобы их не вытесняли фрагменты.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'yatube_cache',
+        'OPTIONS': CACHE_OPTIONS,
+    },
+    'generations': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'yatube_cache_generations',
+        'OPTIONS': CACHE_OPTIONS,
+    },
+}
+POSTS_GENERATION_CACHE = 'generations'
+
+SESSION_COOKIE_SECURE = os.environ.get('YATUBE_HTTPS') == '1'
+CSRF_COOKIE_SECURE = SESSION_COOKIE_SECURE
@@ -0,0 +1,20 @@
+"""Тесты идут на in-memory SQLite, которую видит только соединение,
+создавшее её. Поэтому фоновые задачи выполняются сразу в enqueue(), а
+gather() — по очереди в потоке теста; тесты пула и очереди включают их
+обратно через override_settings.
+"""
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+TEST_SETTINGS = {'POSTS_TASKS_EAGER': True, 'POSTS_GATHER_WORKERS': 0}
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.test_settings = override_settings(**TEST_SETTINGS)
+        self.test_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.test_settings.disable()
+        super().teardown_test_environment(**kwargs)